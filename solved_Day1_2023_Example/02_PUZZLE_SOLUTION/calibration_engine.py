@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Single-pass calibration engine for large inputs.
+
+Digits and spelled-out digit words are matched with Aho-Corasick automata compiled to
+byte transition tables: one scans each line left to right for the first value and one
+scans right to left (over the reversed words) for the last, both stopping as soon as the
+answer is settled.  Files are streamed in large chunks and, when big enough, split on
+line boundaries across a process pool.
+
+Usage:
+    python calibration_engine.py input.txt --workers 8
+    python calibration_engine.py input.txt --compare
+"""
+import argparse
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DIGIT_PATTERNS = {
+    **{str(value).encode(): value for value in range(10)},
+    b'one': 1, b'two': 2, b'three': 3, b'four': 4, b'five': 5,
+    b'six': 6, b'seven': 7, b'eight': 8, b'nine': 9,
+}
+
+CHUNK_SIZE = 8 * 1024 * 1024
+# Files smaller than this are summed in-process; pool start-up costs more than it saves
+PARALLEL_THRESHOLD = 32 * 1024 * 1024
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton compiled to a dense 256-way transition table per state.
+    """
+
+    def __init__(self, patterns: Dict[bytes, int]):
+        """
+        :param patterns: Mapping of byte pattern to the value it stands for
+        """
+        goto: List[Dict[int, int]] = [{}]
+        # (value, length) of the longest pattern ending in each state, if any
+        output: List[Optional[Tuple[int, int]]] = [None]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for byte in pattern:
+                if byte not in goto[state]:
+                    goto.append({})
+                    output.append(None)
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            output[state] = (value, len(pattern))
+
+        # Breadth-first over the trie, filling in failure transitions so every state has
+        # a complete row and inheriting the outputs reachable through failure links
+        self.table: List[List[int]] = [[0] * 256 for _ in goto]
+        fail = [0] * len(goto)
+        queue = []
+        for byte, child in goto[0].items():
+            self.table[0][byte] = child
+            queue.append(child)
+        for state in queue:
+            inherited = output[fail[state]]
+            if inherited is not None and (output[state] is None or output[state][1] < inherited[1]):
+                output[state] = inherited
+            row = self.table[state]
+            row[:] = self.table[fail[state]]
+            for byte, child in goto[state].items():
+                fail[child] = self.table[fail[state]][byte]
+                row[byte] = child
+                queue.append(child)
+
+        self.output = output
+        self.max_length = max((len(pattern) for pattern in patterns), default=0)
+
+    def find_all(self, data: bytes) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (start, value) for every match, overlaps included, in order of match end.
+
+        Only the longest pattern ending at each position is reported.
+        """
+        table, output = self.table, self.output
+        state = 0
+        for index, byte in enumerate(data):
+            state = table[state][byte]
+            found = output[state]
+            if found is not None:
+                yield index - found[1] + 1, found[0]
+
+
+class CalibrationEngine:
+    """
+    Finds the first and last digit value of each line and sums the two-digit calibration values.
+    """
+
+    def __init__(self, patterns: Dict[bytes, int] = DIGIT_PATTERNS):
+        self.forward = Automaton(patterns)
+        self.backward = Automaton({pattern[::-1]: value for pattern, value in patterns.items()})
+
+    def first_value(self, line: bytes) -> Optional[int]:
+        """
+        Value of the match that starts first.
+
+        A match found at some end position can still be beaten by a longer pattern that
+        started earlier, so scanning continues max_length - 1 bytes past the first match.
+        """
+        table, output = self.forward.table, self.forward.output
+        state = 0
+        best_start, best_value, stop = None, None, len(line)
+        index = 0
+        while index < stop:
+            state = table[state][line[index]]
+            found = output[state]
+            if found is not None:
+                start = index - found[1] + 1
+                if best_start is None or start < best_start:
+                    best_start, best_value = start, found[0]
+                    stop = min(stop, start + self.forward.max_length)
+            index += 1
+        return best_value
+
+    def last_value(self, line: bytes) -> Optional[int]:
+        """
+        Value of the match that starts last.
+
+        Scanning the reversed patterns from the end of the line, the first match to complete
+        is the one with the latest start, so the scan stops there.
+        """
+        table, output = self.backward.table, self.backward.output
+        state = 0
+        for index in range(len(line) - 1, -1, -1):
+            state = table[state][line[index]]
+            found = output[state]
+            if found is not None:
+                return found[0]
+        return None
+
+    def calibration_value(self, line: bytes) -> int:
+        first = self.first_value(line)
+        if first is None:
+            return 0
+        return first * 10 + self.last_value(line)
+
+    def sum_buffer(self, buffer: bytes) -> int:
+        """
+        Sums the calibration values of every line in a buffer of whole lines.
+        """
+        value = self.calibration_value
+        return sum(value(line) for line in buffer.split(b'\n') if line)
+
+    def sum_range(self, filename: str, start: int = 0, end: Optional[int] = None,
+                  chunk_size: int = CHUNK_SIZE) -> int:
+        """
+        Streams the lines between two byte offsets (both on line boundaries) in large chunks.
+        """
+        total = 0
+        remainder = b''
+        with open(filename, 'rb') as file:
+            file.seek(start)
+            position = start
+            while end is None or position < end:
+                size = chunk_size if end is None else min(chunk_size, end - position)
+                chunk = file.read(size)
+                if not chunk:
+                    break
+                position += len(chunk)
+                cut = chunk.rfind(b'\n')
+                if cut == -1:
+                    remainder += chunk
+                    continue
+                total += self.sum_buffer(remainder + chunk[:cut])
+                remainder = chunk[cut + 1:]
+        return total + self.sum_buffer(remainder)
+
+
+def split_ranges(filename: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Splits a file into about `parts` byte ranges that each start at the beginning of a line.
+    """
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as file:
+        for part in range(1, parts):
+            file.seek(max(boundaries[-1], size * part // parts))
+            file.readline()
+            boundaries.append(min(file.tell(), size))
+    boundaries.append(size)
+    return [(lo, hi) for lo, hi in zip(boundaries, boundaries[1:]) if hi > lo]
+
+
+_engine: Optional[CalibrationEngine] = None
+
+
+def _sum_range_worker(filename: str, start: int, end: int) -> int:
+    # Built once per worker process rather than pickled with every task
+    global _engine
+    if _engine is None:
+        _engine = CalibrationEngine()
+    return _engine.sum_range(filename, start, end)
+
+
+def find_calibration_value(line: str) -> int:
+    """
+    Drop-in replacement for calibration_part2.find_calibration_value.
+    """
+    global _engine
+    if _engine is None:
+        _engine = CalibrationEngine()
+    return _engine.calibration_value(line.strip().encode())
+
+
+def process_calibration_file(filename: str, workers: Optional[int] = None) -> int:
+    """
+    Sums the calibration values of a file, in parallel when it is large.
+
+    :param filename: Input file, one calibration line per line
+    :param workers: Number of processes; defaults to the CPU count for large files
+    """
+    size = os.path.getsize(filename)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if size >= PARALLEL_THRESHOLD else 1
+    if workers <= 1:
+        return CalibrationEngine().sum_range(filename)
+
+    # Several ranges per worker keeps the pool busy when some ranges run slower
+    ranges = split_ranges(filename, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_sum_range_worker, filename, lo, hi) for lo, hi in ranges]
+        return sum(future.result() for future in futures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sum calibration values with the single-pass engine")
+    parser.add_argument("filename", nargs="?", default="input.txt")
+    parser.add_argument("--workers", type=int, help="Processes to use (default: automatic)")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run calibration_part2.py and report both timings")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = process_calibration_file(args.filename, args.workers)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(args.filename) / (1024 * 1024)
+    print(f"Total calibration value: {total}")
+    print(f"Engine: {elapsed:.3f}s ({size_mb / elapsed if elapsed else 0:.1f} MB/s)")
+
+    if args.compare:
+        import calibration_part2
+
+        start = time.perf_counter()
+        reference = calibration_part2.process_calibration_file(args.filename)
+        elapsed = time.perf_counter() - start
+        print(f"calibration_part2: {elapsed:.3f}s, total {reference}"
+              f" ({'matches' if reference == total else 'MISMATCH'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Array-backed grid and graph primitives for the grid/graph style puzzles.
+
+Cells are addressed by flat index (row * cols + col) so searches work on 1-D NumPy arrays.
+Directions are numbered clockwise from up: 0=up, 1=right, 2=down, 3=left, so a right turn
+is (direction + 1) % 4.
+
+Running the module benchmarks the primitives on the puzzle inputs in node_runner:
+    python grid_toolkit.py --inputs ../../node_runner
+"""
+import argparse
+import heapq
+import os
+import time
+
+from typing import Callable, Iterable, Sequence, Tuple
+
+import numpy as np
+
+UP, RIGHT, DOWN, LEFT = range(4)
+DIRECTIONS = np.array([(-1, 0), (0, 1), (1, 0), (0, -1)], dtype=np.int64)
+UNREACHED = -1
+
+
+class Grid:
+    """
+    A rectangular grid of byte characters stored as a (rows, cols) uint8 array.
+    """
+
+    def __init__(self, cells: np.ndarray):
+        """
+        :param cells: 2-D uint8 array; may be a read-only view of the input bytes
+        """
+        self.cells = cells
+        self.rows, self.cols = cells.shape
+        self._neighbors = None
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "Grid":
+        """
+        Views newline separated rows of equal width as a grid without copying them.
+
+        The newline column (and a carriage return, if present) is sliced away, so the
+        result is a strided view over `raw`.  Input without a final newline is copied once.
+        """
+        width = raw.find(b'\n')
+        width = len(raw) if width == -1 else width
+        terminator = 2 if width and raw[width - 1:width] == b'\r' else 1
+        cols = width - (terminator - 1)
+        stride = cols + terminator
+        if len(raw) % stride:
+            # Missing final newline or extra blank lines at the end
+            raw = raw.rstrip(b'\r\n') + (b'\r\n' if terminator == 2 else b'\n')
+            if len(raw) % stride:
+                raise ValueError("Grid rows must all have the same width")
+        flat = np.frombuffer(raw, dtype=np.uint8)
+        return cls(flat.reshape(-1, stride)[:, :cols])
+
+    @classmethod
+    def from_file(cls, filename: str) -> "Grid":
+        with open(filename, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+    @classmethod
+    def filled(cls, rows: int, cols: int, char: str = '.') -> "Grid":
+        return cls(np.full((rows, cols), ord(char), dtype=np.uint8))
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.cols
+
+    @property
+    def flat(self) -> np.ndarray:
+        """
+        The cells as a 1-D array (copied only if the grid is a strided view).
+        """
+        return self.cells.reshape(-1)
+
+    def copy(self) -> "Grid":
+        return Grid(self.cells.copy())
+
+    def index(self, row: int, col: int) -> int:
+        return row * self.cols + col
+
+    def coords(self, index: int) -> Tuple[int, int]:
+        return divmod(int(index), self.cols)
+
+    def mask(self, chars: str) -> np.ndarray:
+        """
+        Boolean (rows, cols) array of the cells holding any of `chars`.
+        """
+        return np.isin(self.cells, np.frombuffer(chars.encode(), dtype=np.uint8))
+
+    def find(self, char: str) -> np.ndarray:
+        """
+        Flat indices of every cell holding `char`.
+        """
+        return np.flatnonzero(self.cells == ord(char))
+
+    def find_one(self, char: str) -> int:
+        found = self.find(char)
+        if not found.size:
+            raise ValueError(f"{char!r} not found in grid")
+        return int(found[0])
+
+    def digits(self) -> np.ndarray:
+        """
+        The cells as small integers, for digit grids such as height maps.
+        """
+        return self.cells.astype(np.int16) - ord('0')
+
+    @property
+    def neighbors(self) -> np.ndarray:
+        """
+        (size, 4) table of the flat index in each direction, UNREACHED past the edge.
+        """
+        if self._neighbors is None:
+            self._neighbors = neighbor_table(self.rows, self.cols)
+        return self._neighbors
+
+    def __str__(self) -> str:
+        return b'\n'.join(bytes(row) for row in self.cells).decode()
+
+
+def neighbor_table(rows: int, cols: int) -> np.ndarray:
+    """
+    Builds the (rows * cols, 4) neighbor table for a grid shape.
+    """
+    row, col = np.divmod(np.arange(rows * cols, dtype=np.int64), cols)
+    table = np.empty((rows * cols, 4), dtype=np.int64)
+    for direction, (dr, dc) in enumerate(DIRECTIONS):
+        r, c = row + dr, col + dc
+        inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        table[:, direction] = np.where(inside, r * cols + c, UNREACHED)
+    return table
+
+
+def neighbor_count(mask: np.ndarray) -> np.ndarray:
+    """
+    For a boolean (rows, cols) mask, how many of each cell's four neighbors are set.
+    """
+    padded = np.pad(mask, 1).astype(np.int8)
+    return (padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:])
+
+
+def bfs(neighbors: np.ndarray, sources: Iterable[int], passable: np.ndarray) -> np.ndarray:
+    """
+    Level-synchronous breadth-first search over flat indices.
+
+    Each level is expanded with array operations rather than one cell at a time.
+
+    :param neighbors: (size, k) neighbor table, UNREACHED for missing neighbors
+    :param sources: Flat indices at distance 0
+    :param passable: Boolean array (any shape with `size` elements) of enterable cells
+    :return: int64 distance per cell, UNREACHED where unreachable
+    """
+    passable = passable.reshape(-1)
+    distance = np.full(neighbors.shape[0], UNREACHED, dtype=np.int64)
+    frontier = np.unique(np.fromiter(sources, dtype=np.int64))
+    distance[frontier] = 0
+    level = 0
+    while frontier.size:
+        level += 1
+        candidates = neighbors[frontier].reshape(-1)
+        candidates = candidates[candidates != UNREACHED]
+        candidates = np.unique(candidates[passable[candidates] & (distance[candidates] == UNREACHED)])
+        distance[candidates] = level
+        frontier = candidates
+    return distance
+
+
+def flood_fill(neighbors: np.ndarray, start: int, passable: np.ndarray) -> np.ndarray:
+    """
+    Boolean flat mask of the cells reachable from `start`.
+    """
+    return bfs(neighbors, [start], passable) != UNREACHED
+
+
+def distance_fields(neighbors: np.ndarray, sources: Sequence[int], passable: np.ndarray) -> np.ndarray:
+    """
+    One BFS distance field per source, stacked as a (len(sources), size) array.
+
+    Distances between every pair of sources are then fields[:, sources].
+    """
+    return np.stack([bfs(neighbors, [source], passable) for source in sources])
+
+
+def label_regions(cells: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Labels the 4-connected regions of equal value.
+
+    Uses vectorized hooking and pointer jumping: every cell starts as its own label, each
+    round every edge between equal cells pulls both ends' labels down to the smaller one,
+    and labels are then followed to their roots until nothing changes.
+
+    :param cells: 2-D array of cell values
+    :return: Tuple of ((rows, cols) int64 labels numbered from 0, number of regions)
+    """
+    rows, cols = cells.shape
+    index = np.arange(rows * cols, dtype=np.int64).reshape(rows, cols)
+    same_right = cells[:, :-1] == cells[:, 1:]
+    same_down = cells[:-1, :] == cells[1:, :]
+    a = np.concatenate([index[:, :-1][same_right], index[:-1, :][same_down]])
+    b = np.concatenate([index[:, 1:][same_right], index[1:, :][same_down]])
+
+    labels = np.arange(rows * cols, dtype=np.int64)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        hooked = labels.copy()
+        for ends in (a, b, labels[a], labels[b]):
+            np.minimum.at(hooked, ends, low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            break
+        labels = hooked
+
+    roots, compact = np.unique(labels, return_inverse=True)
+    return compact.reshape(rows, cols), len(roots)
+
+
+def region_areas(labels: np.ndarray, count: int) -> np.ndarray:
+    return np.bincount(labels.reshape(-1), minlength=count)
+
+
+def region_perimeters(labels: np.ndarray, count: int) -> np.ndarray:
+    """
+    Number of cell edges on each region's boundary (grid edges included).
+    """
+    padded = np.pad(labels, 1, constant_values=-1)
+    center = padded[1:-1, 1:-1]
+    fences = np.zeros(labels.shape, dtype=np.int64)
+    for shifted in (padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]):
+        fences += shifted != center
+    return np.bincount(labels.reshape(-1), weights=fences.reshape(-1), minlength=count).astype(np.int64)
+
+
+def region_sides(labels: np.ndarray, count: int) -> np.ndarray:
+    """
+    Number of straight sides of each region, counted as its corners.
+
+    A cell has a convex corner where both orthogonal neighbors in a diagonal direction
+    lie outside its region, and a concave corner where both lie inside but the diagonal
+    cell does not.
+    """
+    padded = np.pad(labels, 1, constant_values=-1)
+    center = padded[1:-1, 1:-1]
+    rows, cols = labels.shape
+
+    def shifted(dr, dc):
+        return padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols] == center
+
+    corners = np.zeros(labels.shape, dtype=np.int64)
+    for dr, dc in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+        vertical, horizontal, diagonal = shifted(dr, 0), shifted(0, dc), shifted(dr, dc)
+        corners += (~vertical & ~horizontal) | (vertical & horizontal & ~diagonal)
+    return np.bincount(labels.reshape(-1), weights=corners.reshape(-1), minlength=count).astype(np.int64)
+
+
+def dijkstra(states: int, sources: Iterable[int],
+             edges: Callable[[int], Iterable[Tuple[int, int]]]) -> np.ndarray:
+    """
+    Heap-based Dijkstra over integer states (e.g. cell * 4 + direction).
+
+    :param states: Number of states
+    :param sources: States at cost 0
+    :param edges: Callable returning (next state, cost) pairs for a state
+    :return: int64 cost per state, UNREACHED where unreachable
+    """
+    cost = [None] * states
+    heap = [(0, source) for source in sources]
+    heapq.heapify(heap)
+    while heap:
+        current, state = heapq.heappop(heap)
+        if cost[state] is not None:
+            continue
+        cost[state] = current
+        for following, step in edges(state):
+            if cost[following] is None:
+                heapq.heappush(heap, (current + step, following))
+    return np.array([UNREACHED if value is None else value for value in cost], dtype=np.int64)
+
+
+def manhattan_shortcuts(distance: np.ndarray, radius: int, min_saving: int) -> int:
+    """
+    Counts pairs of reached cells within `radius` Manhattan steps of each other where
+    jumping straight from one to the other saves at least `min_saving` steps of the
+    distance field.  Each offset is checked for the whole grid at once.
+
+    :param distance: (rows, cols) distance field, UNREACHED for walls
+    """
+    rows, cols = distance.shape
+    total = 0
+    for dr in range(-radius, radius + 1):
+        span = radius - abs(dr)
+        for dc in range(-span, span + 1):
+            if not dr and not dc:
+                continue
+            source = distance[max(0, -dr):rows - max(0, dr), max(0, -dc):cols - max(0, dc)]
+            target = distance[max(0, dr):rows + min(0, dr), max(0, dc):cols + min(0, dc)]
+            saving = target - source - (abs(dr) + abs(dc))
+            total += int(np.count_nonzero((source != UNREACHED) & (target != UNREACHED)
+                                          & (saving >= min_saving)))
+    return total
+
+
+# Puzzle benchmarks: each returns its answers for one input
+
+def guard_walk(grid: Grid) -> Tuple[int]:
+    """
+    2024 Day 6 part 1: cells visited by the guard before leaving the grid.
+    """
+    neighbors, blocked = grid.neighbors, grid.flat == ord('#')
+    position, direction = grid.find_one('^'), UP
+    visited = np.zeros(grid.size, dtype=bool)
+    while True:
+        visited[position] = True
+        ahead = neighbors[position, direction]
+        if ahead == UNREACHED:
+            return (int(visited.sum()),)
+        if blocked[ahead]:
+            direction = (direction + 1) % 4
+        else:
+            position = ahead
+
+
+def trailheads(grid: Grid) -> Tuple[int, int]:
+    """
+    2024 Day 10: summed trailhead scores (distinct reachable 9s) and ratings (paths).
+
+    Works down from height 9 one level at a time: path counts add up over uphill
+    neighbors, and reachable summits are carried as integer bitsets.
+    """
+    heights, neighbors = grid.digits().reshape(-1), grid.neighbors
+    paths = (heights == 9).astype(np.int64)
+    summits = [0] * grid.size
+    for bit, index in enumerate(np.flatnonzero(heights == 9)):
+        summits[index] = 1 << bit
+    for height in range(8, -1, -1):
+        cells = np.flatnonzero(heights == height)
+        uphill = neighbors[cells]
+        valid = (uphill != UNREACHED) & (heights[uphill] == height + 1)
+        paths[cells] = np.where(valid, paths[uphill], 0).sum(axis=1)
+        for cell, row, ok in zip(cells, uphill, valid):
+            reach = 0
+            for neighbor in row[ok]:
+                reach |= summits[neighbor]
+            summits[cell] = reach
+    starts = np.flatnonzero(heights == 0)
+    return sum(bin(summits[start]).count('1') for start in starts), int(paths[starts].sum())
+
+
+def garden_regions(grid: Grid) -> Tuple[int, int]:
+    """
+    2024 Day 12: fence price by perimeter and by number of sides.
+    """
+    labels, count = label_regions(grid.cells)
+    areas = region_areas(labels, count)
+    return (int((areas * region_perimeters(labels, count)).sum()),
+            int((areas * region_sides(labels, count)).sum()))
+
+
+def reindeer_maze(grid: Grid) -> Tuple[int, int]:
+    """
+    2024 Day 16: lowest score (1 per step, 1000 per turn) and tiles on any best path.
+    """
+    neighbors, open_cells = grid.neighbors, grid.flat != ord('#')
+
+    def forward(state):
+        cell, direction = divmod(state, 4)
+        ahead = neighbors[cell, direction]
+        if ahead != UNREACHED and open_cells[ahead]:
+            yield ahead * 4 + direction, 1
+        yield cell * 4 + (direction + 1) % 4, 1000
+        yield cell * 4 + (direction + 3) % 4, 1000
+
+    def backward(state):
+        cell, direction = divmod(state, 4)
+        behind = neighbors[cell, (direction + 2) % 4]
+        if behind != UNREACHED and open_cells[behind]:
+            yield behind * 4 + direction, 1
+        yield cell * 4 + (direction + 1) % 4, 1000
+        yield cell * 4 + (direction + 3) % 4, 1000
+
+    start, end = grid.find_one('S'), grid.find_one('E')
+    states = grid.size * 4
+    from_start = dijkstra(states, [start * 4 + RIGHT], forward)
+    to_end = dijkstra(states, [end * 4 + direction for direction in range(4)], backward)
+    end_costs = from_start[end * 4:end * 4 + 4]
+    best = int(end_costs[end_costs != UNREACHED].min())
+    on_path = (from_start != UNREACHED) & (to_end != UNREACHED) & (from_start + to_end == best)
+    return best, int(np.unique(np.flatnonzero(on_path) // 4).size)
+
+
+def falling_bytes(raw: bytes, size: int = 71, fallen: int = 1024) -> Tuple[int, str]:
+    """
+    2024 Day 18: shortest path after `fallen` bytes, and the first byte that cuts it off.
+    """
+    points = np.array([line.split(b',') for line in raw.split()], dtype=np.int64)
+    neighbors = neighbor_table(size, size)
+    flat = points[:, 1] * size + points[:, 0]
+    goal = size * size - 1
+
+    def distance(count):
+        passable = np.ones(size * size, dtype=bool)
+        passable[flat[:count]] = False
+        return bfs(neighbors, [0], passable)[goal]
+
+    low, high = fallen, len(flat)
+    while low < high:
+        middle = (low + high) // 2
+        if distance(middle + 1) == UNREACHED:
+            high = middle
+        else:
+            low = middle + 1
+    blocker = points[low] if low < len(points) else None
+    return int(distance(fallen)), (f"{blocker[0]},{blocker[1]}" if blocker is not None else "none")
+
+
+def race_cheats(grid: Grid, min_saving: int = 100) -> Tuple[int, int]:
+    """
+    2024 Day 20: cheats saving at least `min_saving` with up to 2 and up to 20 steps.
+    """
+    track = grid.mask('.SE')
+    distance = bfs(grid.neighbors, [grid.find_one('S')], track).reshape(grid.rows, grid.cols)
+    return (manhattan_shortcuts(distance, 2, min_saving),
+            manhattan_shortcuts(distance, 20, min_saving))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grid toolkit on the puzzle inputs")
+    parser.add_argument("--inputs", default=os.path.join("..", "..", "node_runner"),
+                        help="Folder holding input.dayN.txt files")
+    args = parser.parse_args()
+
+    def load(day):
+        with open(os.path.join(args.inputs, f"input.day{day}.txt"), 'rb') as file:
+            return file.read()
+
+    benchmarks = [
+        (6, lambda raw: guard_walk(Grid.from_bytes(raw))),
+        (10, lambda raw: trailheads(Grid.from_bytes(raw))),
+        (12, lambda raw: garden_regions(Grid.from_bytes(raw))),
+        (16, lambda raw: reindeer_maze(Grid.from_bytes(raw))),
+        (18, falling_bytes),
+        (20, lambda raw: race_cheats(Grid.from_bytes(raw))),
+    ]
+    for day, solve in benchmarks:
+        try:
+            raw = load(day)
+        except FileNotFoundError:
+            print(f"Day {day}: no input")
+            continue
+        start = time.perf_counter()
+        answers = solve(raw)
+        print(f"Day {day}: {answers} in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
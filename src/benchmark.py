@@ -0,0 +1,298 @@
+'''
+Benchmark and regression check for the solved days' TypeScript solutions
+
+Each solution is compiled once into its own sandbox under .benchmark/, then run
+repeatedly with node.  Median/p95 wall time and peak RSS are written to a results file
+and compared against a stored baseline.
+
+Example:
+    python src/benchmark.py --runs 5 --update-baseline
+    python src/benchmark.py --day 16 --day 20 --source node_runner
+'''
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from script_runner import parse_script
+from tools.node_runner_tool import NODE_RUNNER_PATH, find_tsc, run_node
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SOLVED_DAY = re.compile(r"^solved_work_Day(\d+)$")
+NODE_RUNNER_SOLUTION = re.compile(r"^index\.day(\d+)(?:\.(pt\d))?\.ts$")
+
+
+def discover(source="solved_work", days=None, root=REPO_ROOT):
+    """
+    Finds the solutions to benchmark.
+
+    :param source: "solved_work" for solved_work_DayN/02_PUZZLE_SOLUTION/index.ts, or
+        "node_runner" for node_runner/src/solved/index.dayN[.ptK].ts
+    :param days: Optional list of day numbers to keep
+    :param root: Repository root
+    :return: List of {"name", "day", "solution", "input", "expected"} dictionaries
+    """
+    targets = []
+    if source == "solved_work":
+        for entry in os.listdir(root):
+            found = SOLVED_DAY.match(entry)
+            solution_folder = os.path.join(root, entry, "02_PUZZLE_SOLUTION")
+            if not found or not os.path.isfile(os.path.join(solution_folder, "index.ts")):
+                continue
+            input_file = os.path.join(solution_folder, "input.txt")
+            if not os.path.isfile(input_file):
+                input_file = os.path.join(root, entry, "01_PUZZLE", "input.txt")
+            targets.append({
+                "name": f"day{found.group(1)}",
+                "day": int(found.group(1)),
+                "solution": os.path.join(solution_folder, "index.ts"),
+                "input": input_file,
+            })
+    else:
+        solved_path = os.path.join(root, "node_runner", "src", "solved")
+        for entry in os.listdir(solved_path):
+            found = NODE_RUNNER_SOLUTION.match(entry)
+            if not found:
+                continue
+            day = int(found.group(1))
+            targets.append({
+                "name": f"day{day}" + (f".{found.group(2)}" if found.group(2) else ""),
+                "day": day,
+                "solution": os.path.join(solved_path, entry),
+                "input": os.path.join(root, "node_runner", f"input.day{day}.txt"),
+            })
+
+    targets = [
+        target for target in targets
+        if os.path.isfile(target["input"]) and (not days or target["day"] in days)
+    ]
+    for target in targets:
+        expected = expected_answers(os.path.join(root, f"solved_work_Day{target['day']}"))
+        # index.day15.pt1.ts only answers "... Pt 1"
+        part = target["name"].partition(".pt")[2]
+        target["expected"] = {
+            title: answer for title, answer in expected.items()
+            if not part or title.endswith(f"Pt {part}")
+        }
+    return sorted(targets, key=lambda target: (target["day"], target["name"]))
+
+
+def expected_answers(day_folder):
+    """
+    Recorded answers from a day's script.txt, keyed by part title.
+
+    Answer lines sometimes carry notes ("92082041 --> iterated ..."), so only the first
+    number is kept.  Parts without a recorded answer are left out.
+    """
+    script_path = os.path.join(day_folder, "script.txt")
+    if not os.path.isfile(script_path):
+        return {}
+    answers = {}
+    for part in parse_script(script_path):
+        number = re.search(r"\d+", part["expected_answer"] or "")
+        if number:
+            answers[part["title"]] = number.group(0)
+    return answers
+
+
+def compile_solution(target, work_path, tsc):
+    """
+    Compiles a solution into its sandbox, skipping the compile if the source is unchanged
+    and compiled cleanly last time.
+
+    The sandbox holds the input as both input.txt and src/input.txt, since solutions
+    read either path relative to the working directory.
+
+    :return: Path of the compiled script, relative to the sandbox
+    """
+    sandbox = os.path.join(work_path, target["name"])
+    os.makedirs(os.path.join(sandbox, "src"), exist_ok=True)
+    for dest in ("input.txt", os.path.join("src", "input.txt")):
+        shutil.copyfile(target["input"], os.path.join(sandbox, dest))
+
+    with open(target["solution"], "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    stamp = os.path.join(sandbox, "build", ".source_sha256")
+    script = os.path.join("build", "index.js")
+    if os.path.isfile(stamp) and open(stamp, encoding="utf-8").read() == digest:
+        return script
+
+    with open(os.path.join(sandbox, "src", "index.ts"), "wb") as f:
+        f.write(source)
+    shutil.copyfile(os.path.join(NODE_RUNNER_PATH, "package.json"), os.path.join(sandbox, "package.json"))
+    with open(os.path.join(sandbox, "tsconfig.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "extends": os.path.join(NODE_RUNNER_PATH, "tsconfig.json"),
+            "compilerOptions": {
+                "outDir": "build",
+                "baseUrl": "src",
+                "typeRoots": [os.path.join(NODE_RUNNER_PATH, "node_modules", "@types")],
+            },
+            "include": ["src/**/*.ts"],
+        }, f, indent=2)
+
+    # Output of an earlier source must never stand in for a failed compile
+    shutil.rmtree(os.path.join(sandbox, "build"), ignore_errors=True)
+    completed = subprocess.run(
+        [tsc, "--pretty", "false", "-p", sandbox], capture_output=True, text=True
+    )
+    if not os.path.isfile(os.path.join(sandbox, script)):
+        raise RuntimeError(f"tsc failed: {completed.stdout.strip()[:2000]}")
+    # tsc still emits JavaScript on type errors; that build is used for this run, but
+    # without a stamp so the next run compiles (and reports) it again
+    if completed.returncode == 0:
+        with open(stamp, "w", encoding="utf-8") as f:
+            f.write(digest)
+    return script
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def benchmark(target, work_path, tsc, runs=5, warmup=1, timeout=120, memory_mb=4096):
+    """
+    Runs one solution `warmup + runs` times and summarizes the measured runs.
+
+    Solutions print both parts from one process, so the timings cover the whole program;
+    each recorded answer is checked by looking for it in the output.
+
+    :return: Result dictionary for the results file
+    """
+    try:
+        script = compile_solution(target, work_path, tsc)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    sandbox = os.path.join(work_path, target["name"])
+    samples = []
+    for index in range(warmup + runs):
+        run = run_node(script, sandbox, timeout, memory_mb)
+        if run["timed_out"] or run["exit_status"] != 0:
+            return {
+                "error": "timed out" if run["timed_out"] else f"exit status {run['exit_status']}",
+                "stderr": run["stderr"][-2000:],
+            }
+        if index >= warmup:
+            samples.append(run)
+
+    wall = [run["wall_seconds"] for run in samples]
+    rss = [run["peak_rss_mb"] for run in samples if run["peak_rss_mb"] is not None]
+    output = samples[-1]["stdout"]
+    return {
+        "runs": len(samples),
+        "median_seconds": round(statistics.median(wall), 4),
+        "p95_seconds": round(percentile(wall, 0.95), 4),
+        "peak_rss_mb": max(rss) if rss else None,
+        "answers": {
+            part: bool(re.search(rf"(?<!\d){answer}(?!\d)", output))
+            for part, answer in target["expected"].items()
+        },
+    }
+
+
+def compare(results, baseline, tolerance=0.2, min_seconds=0.02, min_rss_mb=16):
+    """
+    Lists regressions of results against a baseline.
+
+    A solution regresses when it now fails, loses a correct answer, or its median time or
+    peak RSS grows by more than `tolerance` (and by more than the absolute minimums, so
+    millisecond noise on fast days is ignored).
+
+    :return: List of human readable regression descriptions
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or "error" in before:
+            continue
+        if "error" in result:
+            regressions.append(f"{name}: now fails ({result['error']})")
+            continue
+
+        median, base_median = result["median_seconds"], before["median_seconds"]
+        if median > base_median * (1 + tolerance) and median - base_median > min_seconds:
+            regressions.append(f"{name}: median {base_median:.3f}s -> {median:.3f}s")
+
+        rss, base_rss = result.get("peak_rss_mb"), before.get("peak_rss_mb")
+        if rss and base_rss and rss > base_rss * (1 + tolerance) and rss - base_rss > min_rss_mb:
+            regressions.append(f"{name}: peak RSS {base_rss:.0f}MB -> {rss:.0f}MB")
+
+        for part, correct in result["answers"].items():
+            if not correct and before.get("answers", {}).get(part):
+                regressions.append(f"{name}: {part} answer no longer matches")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the solved days' solutions")
+    parser.add_argument("--source", choices=["solved_work", "node_runner"], default="solved_work",
+                        help="Benchmark solved_work_DayN solutions or node_runner/src/solved")
+    parser.add_argument("--day", type=int, action="append", dest="days",
+                        help="Only benchmark this day; may be repeated")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per solution")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per solution")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a run is killed")
+    parser.add_argument("--memory-mb", type=int, default=4096, help="Node heap limit per run")
+    parser.add_argument("--work-dir", default=".benchmark", help="Folder for compiled sandboxes")
+    parser.add_argument("--output", default="benchmark_results.json", help="Results file to write")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="Baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown or memory growth that counts as a regression")
+    args = parser.parse_args()
+
+    tsc = find_tsc()
+    if tsc is None:
+        print("TypeScript compiler not found; run npm install in node_runner")
+        sys.exit(2)
+
+    targets = discover(args.source, args.days)
+    work_path = os.path.abspath(args.work_dir)
+    results = {}
+    for target in targets:
+        result = benchmark(target, work_path, tsc, args.runs, args.warmup, args.timeout, args.memory_mb)
+        results[target["name"]] = result
+        if "error" in result:
+            print(f"{target['name']}: FAILED {result['error']}")
+        else:
+            answers = " ".join(
+                f"{part.split()[-1]}={'ok' if correct else 'WRONG'}"
+                for part, correct in result["answers"].items()
+            )
+            print(f"{target['name']}: median {result['median_seconds']:.3f}s "
+                  f"p95 {result['p95_seconds']:.3f}s rss {result['peak_rss_mb']}MB {answers}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"source": args.source, "timestamp": time.time(), "results": results}, f, indent=2)
+
+    regressions = []
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"source": args.source, "timestamp": time.time(), "results": results}, f, indent=2)
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("source", args.source) == args.source:
+            regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+    failed = any("error" in result for result in results.values())
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,160 @@
 '''
 Testing out the AWS multi-agent orchestrator library
 '''
+import argparse
+import asyncio
+import contextvars
+import importlib
 import os
 import shutil
+import sys
+import threading
+import time
 
-import gradio as gr
-from multi_agent_orchestrator.orchestrator import MultiAgentOrchestrator
-from multi_agent_orchestrator.agents import (
-    BedrockLLMAgent,
-    BedrockLLMAgentOptions,
-    AgentCallbacks
-)
 from multi_agent_orchestrator.types import ConversationMessage
 
-import boto3
-from botocore.config import Config
+from tools import filesystem_tool, node_runner_tool
+from tools.context_prefetch import ContextBundleClient
+from tools.history_policy import HistoryPolicy, HistoryPolicyClient
+from tools.instrumentation import InstrumentedClassifier, InstrumentedClient, recorder
+from tools.response_cache import CachingClient, ResponseCache
 
-from tools import filesystem_tool
+# gradio, boto3 and the orchestrator's agents take seconds to import, so they are only
+# imported on first use (see lazy_import) and gradio is never imported when headless
+import_timings = {}
+_import_lock = threading.Lock()
 
-class BedrockLLMAgentCallbacks(AgentCallbacks):
+
+def lazy_import(module_name):
+    '''
+    Import a module on first use, recording how long the import took
+    '''
+    module = sys.modules.get(module_name)
+    if module is not None and module_name in import_timings:
+        return module
+    # Serialized so parallel headless runs never see a partially initialized module
+    with _import_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        import_timings[module_name] = time.perf_counter() - start
+        return module
+
+
+def print_import_report():
+    '''
+    Print how long each deferred import took, slowest first
+    '''
+    print("\n** IMPORT TIMES ** \n")
+    for module_name, seconds in sorted(import_timings.items(), key=lambda item: -item[1]):
+        print(f"> {module_name}: {seconds:.3f}s")
+    print(f"> Total: {sum(import_timings.values()):.3f}s")
+
+
+# Token sink for the request running in the current context, set by chat_responder
+current_token_sink = contextvars.ContextVar("current_token_sink", default=None)
+
+
+class TokenSink:
+    '''
+    Batches streamed tokens and fans each batch out to a set of targets (UI, log, ...)
+
+    A batch is flushed once it holds flush_chars characters or flush_interval seconds
+    have passed since the previous flush, so the first token always goes out at once.
+    Text from successive model rounds of one turn (around tool calls) is separated by
+    round_separator.
+    '''
+
+    round_separator = "\n\n---\n\n"
+
+    def __init__(self, targets, flush_interval=0.05, flush_chars=64):
+        """
+        :param targets: Callables that each receive a flushed chunk of text
+        :param flush_interval: Maximum seconds a token waits in the buffer while tokens arrive
+        :param flush_chars: Buffer size that triggers an immediate flush
+        """
+        self.targets = targets
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self._buffer = []
+        self._buffered_chars = 0
+        self._last_flush = 0.0
+        self._written = False
+        self._separate = False
+        self._lock = threading.Lock()
+
+    def new_round(self) -> None:
+        """
+        Marks the start of another model round; the separator is only written once the
+        round streams text after earlier text.
+        """
+        with self._lock:
+            self._separate = self._written
+
+    def write(self, token: str) -> None:
+        with self._lock:
+            if self._separate:
+                token = self.round_separator + token
+                self._separate = False
+            self._written = True
+            self._buffer.append(token)
+            self._buffered_chars += len(token)
+            due = (
+                self._buffered_chars >= self.flush_chars
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._buffer:
+                return
+            chunk = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered_chars = 0
+            self._last_flush = time.monotonic()
+        for target in self.targets:
+            target(chunk)
+
+
+def log_tokens(chunk: str) -> None:
+    '''
+    TokenSink target that echoes streamed text to the console
+    '''
+    sys.stdout.write(chunk)
+    sys.stdout.flush()
+
+
+def with_round_separator(tools_handler):
+    '''
+    Wrap an agent's tool handler so the text streamed by the next model round is
+    separated from the text streamed before the tool call
+    '''
+    async def handler(response, conversation):
+        sink = current_token_sink.get()
+        if sink is not None:
+            sink.new_round()
+        return await tools_handler(response, conversation)
+
+    return handler
+
+
+class BedrockLLMAgentCallbacks:
     '''
     Generic agent callback
+
+    Implements the AgentCallbacks interface without subclassing it, so that defining it
+    does not pull in multi_agent_orchestrator.agents (and boto3) at import time.
     '''
     def on_llm_new_token(self, token: str) -> None:
         # handle response streaming here
-        print(token, end="", flush=True)
+        # Without a sink (e.g. a bare route_request call) the tokens are dropped; the
+        # final message carries the same text
+        sink = current_token_sink.get()
+        if sink is not None:
+            sink.write(token)
 
 
 class UIClient:
@@ -32,29 +162,202 @@ class UIClient:
     Generic wrapper class for gradio UI
     '''
 
-    def __init__(self) -> None:
-        
-        self.orchestrator = MultiAgentOrchestrator()
-        self.register_agents()
+    def __init__(self, work_folder="./work", client=None, response_cache=None,
+                 fast_routing=True, history_policy=None, prefetch_context=True) -> None:
+        """
+        The model client, orchestrator and agents are built on first use.
 
-    def draw_ui(self):
+        :param work_folder: Folder holding 01_PUZZLE and 02_PUZZLE_SOLUTION for the agents
+        :param client: bedrock-runtime compatible client; defaults to a boto3 client
+        :param response_cache: Optional ResponseCache for recording/replaying model calls;
+            defaults to the one configured by PUZZLER_CACHE_MODE
+        :param fast_routing: Route unambiguous turns locally (router.FastPathClassifier)
+            and only call the LLM classifier for the rest
+        :param history_policy: HistoryPolicy bounding the conversation each agent sends;
+            defaults to HistoryPolicy()
+        :param prefetch_context: Attach the files the Software Engineer reads first
+            (Solution.md, index.base.ts, input.txt, ...) to its requests, preloaded as soon
+            as Solution.md is written (see tools.context_prefetch)
+        """
+        self.work_folder = work_folder
+        self.fast_routing = fast_routing
+        self._client = client
+        self._orchestrator = None
+        # Gradio runs handlers on several threads; the first requests may race to build
+        self._init_lock = threading.Lock()
+        self._storage = None
+        self.response_cache = response_cache or ResponseCache.from_env()
+        self.history_policy = history_policy or HistoryPolicy()
+        self.prefetch_context = prefetch_context
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    self._client = self.create_client()
+        return self._client
+
+    @property
+    def storage(self):
+        # multi_agent_orchestrator.storage imports boto3 (for DynamoDbChatStorage), so
+        # the storage is only built with the first request
+        if self._storage is None:
+            with self._init_lock:
+                if self._storage is None:
+                    # Imported on its own so the import report shows where the time goes
+                    lazy_import("multi_agent_orchestrator.storage")
+                    self._storage = lazy_import("session_storage").SessionChatStorage()
+        return self._storage
+
+    @property
+    def orchestrator(self):
+        if self._orchestrator is None:
+            # Resolved before taking the lock, which the client and storage properties also use
+            self.client
+            self.storage
+            with self._init_lock:
+                if self._orchestrator is None:
+                    self._orchestrator = self._build_orchestrator()
+        return self._orchestrator
+
+    def _build_orchestrator(self):
+        '''
+        Build the orchestrator with its classifier and agents; it is only published once
+        every agent is registered
+        '''
+        orchestrator = lazy_import("multi_agent_orchestrator.orchestrator")
+        classifiers = lazy_import("multi_agent_orchestrator.classifiers")
+        classifier = classifiers.BedrockClassifier(classifiers.BedrockClassifierOptions(
+            client=self.agent_client("classifier", compact_history=False)
+        ))
+        if self.fast_routing:
+            classifier = lazy_import("router").FastPathClassifier(classifier)
+        built = orchestrator.MultiAgentOrchestrator(
+            storage=self.storage,
+            classifier=InstrumentedClassifier(classifier),
+        )
+        self.register_agents(built)
+        return built
+
+    @staticmethod
+    def create_client():
+        '''
+        Build the bedrock-runtime client shared by the classifier and agents
+
+        Pool size, endpoint and hedging come from PUZZLER_BEDROCK_* / PUZZLER_HEDGE
+        (see tools.bedrock_client)
+        '''
+        lazy_import("boto3")
+        lazy_import("botocore.config")
+        return lazy_import("tools.bedrock_client").client_from_env()
+
+    def agent_client(self, name, compact_history=True, context_folder=None):
+        '''
+        Wrap the shared client for one agent with response caching, instrumentation, the
+        optional context bundle of context_folder and (outermost, so cached and measured
+        requests are the compacted ones) history compaction
+        '''
+        client = self.client
+        if self.response_cache is not None:
+            client = CachingClient(client, self.response_cache)
+        client = InstrumentedClient(client, name)
+        reserved_tokens = None
+        if context_folder:
+            client = ContextBundleClient(client, context_folder)
+            # The bundle is attached after compaction, so the policy leaves room for it
+            reserved_tokens = client.reserved_tokens
+        if compact_history:
+            client = HistoryPolicyClient(client, self.history_policy, reserved_tokens)
+        return client
+
+    async def route_request(self, question, user_id, session_id):
+        '''
+        Route a question through the orchestrator, recording how long the whole turn took
+        (routing itself is recorded by InstrumentedClassifier)
+
+        Turns within one session run one at a time; different sessions run concurrently.
+        '''
+        turn_lock = self.storage.turn_lock(user_id, session_id)
+        await asyncio.to_thread(turn_lock.acquire)
+        try:
+            start = time.perf_counter()
+            response = await self.orchestrator.route_request(question, user_id, session_id)
+        finally:
+            turn_lock.release()
+
+        if recorder.enabled:
+            recorder.record(
+                "turn", response.metadata.agent_name, time.perf_counter() - start,
+                session_id=session_id,
+            )
+            recorder.write_snapshot()
+        return response
+
+    def draw_ui(self, concurrency_limit=4):
         """
         Main entrypoint
+
+        :param concurrency_limit: Number of chat turns (across all browser sessions)
+            that may be processed at the same time
         """
-        gr.ChatInterface(self.chat_responder).launch()
+        gr = lazy_import("gradio")
+
+        # gradio injects the request for parameters annotated with gr.Request; each
+        # browser connection gets its own session_hash and therefore its own history
+        async def respond(question, history, request: gr.Request):
+            async for reply in self.chat_responder(question, history, request.session_hash):
+                yield reply
 
-    async def chat_responder(self, question, history):
+        gr.ChatInterface(respond, concurrency_limit=concurrency_limit).queue(
+            default_concurrency_limit=concurrency_limit
+        ).launch()
+
+    async def chat_responder(self, question, history, session_id="session021"):
         """
         Example Question:
         As an elf, which information do I have available?
         See script.txt in the project root for a scenario
+
+        :param session_id: Conversation to continue; the UI passes one per browser connection
+
+        Streams the reply as it is generated.  The Bedrock client blocks while reading
+        the stream, so the request runs on its own event loop in a worker thread and
+        hands batches of tokens back to this generator through a queue.  Text from
+        each model round is shown as it streams, separated by TokenSink.round_separator;
+        when the turn completes, the shown text is replaced by the final message.
         """
-        response = await self.orchestrator.route_request(
-            question, "shankinson", "session021"
-        )
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        sink = TokenSink([
+            lambda chunk: loop.call_soon_threadsafe(chunks.put_nowait, chunk),
+            log_tokens,
+        ])
+        current_token_sink.set(sink)
+
+        request = asyncio.ensure_future(asyncio.to_thread(
+            asyncio.run,
+            self.route_request(question, "shankinson", session_id),
+        ))
+
+        streamed = ""
+        while not request.done():
+            try:
+                streamed += await asyncio.wait_for(chunks.get(), sink.flush_interval)
+                yield streamed
+            except asyncio.TimeoutError:
+                # Push out tokens that arrived after the last flush
+                sink.flush()
+
+        sink.flush()
+        await asyncio.sleep(0)
+        while not chunks.empty():
+            streamed += chunks.get_nowait()
+
+        response = request.result()
         print("\n** HISTORY ** \n")
         print(history)
-        # Handle non-streaming response (AgentProcessingResult)
+        # Log the final response (AgentProcessingResult)
         print("\n** RESPONSE ** \n")
         print(f"> Agent ID: {response.metadata.agent_id}")
         print(f"> Agent Name: {response.metadata.agent_name}")
@@ -64,14 +367,20 @@ class UIClient:
         print(f"> Additional Parameters: {response.metadata.additional_params}")
         print(f"\n> Response: {response.output.content}")
         if isinstance(response.output, ConversationMessage):
-            return response.output.content[0].get("text")
+            # The stream also carried the narration of every tool round; once the turn is
+            # done, the chat keeps only the final answer
+            final_text = "".join(block.get("text", "") for block in response.output.content)
+            yield final_text or streamed
         else:
-            return "Error processing response"
+            yield "Error processing response"
 
-    def register_agents(self):
+    def register_agents(self, orchestrator):
         '''
         Register all of the agents in this workflow with mutli-agent-orchestrator
         '''
+        agents = lazy_import("multi_agent_orchestrator.agents")
+        BedrockLLMAgent = agents.BedrockLLMAgent
+        BedrockLLMAgentOptions = agents.BedrockLLMAgentOptions
 
         # Added implementation notes for the Solver and Implementer
         implementation_notes = '''
@@ -96,17 +405,11 @@ class UIClient:
         - Language: TypeScript
         - Package Manager: npm
         '''
-        
-        
-        # Claude likes to think about it -- give more time than the boto3 default 60s
-        session = boto3.Session()
-        config = Config(read_timeout=300)
-        longer_client = session.client("bedrock-runtime", config=config)
 
         puzzle_agent = BedrockLLMAgent(
             BedrockLLMAgentOptions(
                 name="Puzzle Solver",
-                streaming=False,
+                streaming=True,
                 description="Specializes in reading the initial puzzle to pull separate narrative fluff from meaningful \
                     content. Responsible for thinking about the puzzle details and translating them into logical steps to \
                     generate a solution.  Provides solution approach and code examples in Markdown format. Please also keep \
@@ -119,26 +422,29 @@ class UIClient:
                 tool_config={
                     "tool": filesystem_tool.filesystem_tools_description,
                     "toolMaxRecursion": 5,
-                    "useToolHandler": filesystem_tool.file_tools_handler,
+                    "useToolHandler": with_round_separator(filesystem_tool.make_tools_handler(
+                        history_policy=self.history_policy
+                    )),
                 },
                 callbacks=BedrockLLMAgentCallbacks(),
-                client=longer_client
+                client=self.agent_client("Puzzle Solver")
             )
         )
         puzzle_agent.set_system_prompt(
             filesystem_tool.filesystem_tools_prompt,
             {
                 "ROLE": "Puzzle Reader",
-                "ROLE_INPUT_FOLDER": "./work/01_PUZZLE"
+                "ROLE_INPUT_FOLDER": os.path.join(self.work_folder, "01_PUZZLE")
             },
         )
-        self.orchestrator.add_agent(puzzle_agent)
+        orchestrator.add_agent(puzzle_agent)
 
+        solution_folder = os.path.join(self.work_folder, "02_PUZZLE_SOLUTION")
 
         software_agent = BedrockLLMAgent(
             BedrockLLMAgentOptions(
                 name="Software Engineer",
-                streaming=False,
+                streaming=True,
                 description=f"Skilled software engineer with experience solving complex coding puzzles.  \
                     Responsible for implementing the Typescript code to calculate the puzzle answers.  Carry out \
                     puzzle implementation detailed by Puzzle Solver with the following additional details in mind: \
@@ -149,24 +455,41 @@ class UIClient:
                     'temperature': 0.0
                 },
                 tool_config={
-                    "tool": filesystem_tool.filesystem_tools_description,
+                    "tool": filesystem_tool.filesystem_tools_description
+                    + node_runner_tool.node_runner_tools_description,
                     "toolMaxRecursion": 5,
-                    "useToolHandler": filesystem_tool.file_tools_handler,
+                    "useToolHandler": with_round_separator(filesystem_tool.make_tools_handler(
+                        node_runner_tool.node_runner_tool_functions, self.history_policy
+                    )),
                 },
                 callbacks=BedrockLLMAgentCallbacks(),
-                client=longer_client
+                client=self.agent_client(
+                    "Software Engineer",
+                    context_folder=solution_folder if self.prefetch_context else None,
+                )
             )
         )
         software_agent.set_system_prompt(
-            filesystem_tool.filesystem_tools_prompt,
+            filesystem_tool.filesystem_tools_prompt + node_runner_tool.node_runner_tools_prompt,
             {
                 "ROLE": "Software Engineer",
-                "ROLE_INPUT_FOLDER": "./work/02_PUZZLE_SOLUTION"
+                "ROLE_INPUT_FOLDER": solution_folder
             }
         )
-        self.orchestrator.add_agent(software_agent)
+        orchestrator.add_agent(software_agent)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat UI for the puzzle solving agents")
+    parser.add_argument("--import-report", action="store_true",
+                        help="Print how long the deferred imports took before launching")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Chat turns processed at the same time across all sessions")
+    args = parser.parse_args()
+
     client = UIClient()
-    client.draw_ui()
+    if args.import_report:
+        lazy_import("gradio")
+        client.orchestrator
+        print_import_report()
+    client.draw_ui(concurrency_limit=args.concurrency)
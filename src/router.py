@@ -0,0 +1,132 @@
+'''
+Local fast-path routing that skips the LLM classifier for unambiguous turns
+'''
+import re
+import time
+
+from typing import Dict, List, Optional
+
+from multi_agent_orchestrator.classifiers import Classifier, ClassifierResult
+from multi_agent_orchestrator.types import ConversationMessage
+
+from tools.instrumentation import recorder
+
+# Cheap hints used when a turn names no role and there is no previous agent to stick to
+DEFAULT_KEYWORD_RULES = {
+    "software-engineer": [
+        r"\bindex(?:\.base)?\.ts\b",
+        r"\btypescript\b",
+        r"\bimplement",
+        r"\bcompile",
+        r"\bnpm\b",
+    ],
+    "puzzle-solver": [
+        r"\bpuzzle2?\.txt\b",
+        r"\bplan\b",
+        r"\bnarrative\b",
+    ],
+}
+
+# Assistant messages in the chat history are stored as "[agent-id] text"
+HISTORY_AGENT_PREFIX = re.compile(r"^\[([a-z-]+)\]")
+
+
+class FastPathClassifier(Classifier):
+    '''
+    Picks an agent locally and only asks the wrapped classifier when the turn is ambiguous
+
+    Rules, in order:
+    1. Explicit role prefix: "As the Software Engineer, ..." selects that agent.
+    2. Sticky routing: a turn with no prefix stays with the session's previous agent,
+       unless the keyword rules point clearly at a different agent.
+    3. Keyword rules: with no previous agent, a unique best keyword match wins.
+    Anything else falls back to the wrapped classifier.
+    '''
+
+    def __init__(self, fallback: Classifier, keyword_rules: Optional[Dict[str, List[str]]] = None):
+        """
+        :param fallback: Classifier used for ambiguous turns (usually a BedrockClassifier)
+        :param keyword_rules: Mapping of agent id to regexes; defaults to DEFAULT_KEYWORD_RULES
+        """
+        # Classifier.__init__ builds a default BedrockLLMAgent (and a boto3 client) that
+        # this classifier never uses, so only the attributes set_agents relies on are set
+        self.agents = {}
+        self.agent_descriptions = ""
+        self.fallback = fallback
+        self.keyword_rules = {
+            agent_id: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for agent_id, patterns in (keyword_rules or DEFAULT_KEYWORD_RULES).items()
+        }
+        self._role_prefixes = []
+
+    def set_agents(self, agents) -> None:
+        super().set_agents(agents)
+        self.fallback.set_agents(agents)
+        self._role_prefixes = [
+            (re.compile(rf"^\W*(?:as\s+(?:the|a|an)\s+)?{re.escape(agent.name)}\b", re.IGNORECASE),
+             agent_id)
+            for agent_id, agent in agents.items()
+        ]
+
+    async def classify(self, input_text: str, chat_history: List[ConversationMessage]) -> ClassifierResult:
+        # Skip the base class prompt rendering; the fallback renders its own
+        return await self.process_request(input_text, chat_history)
+
+    async def process_request(self,
+                              input_text: str,
+                              chat_history: List[ConversationMessage]) -> ClassifierResult:
+        start = time.perf_counter()
+        rule, agent_id = self.match(input_text, chat_history)
+
+        if agent_id is not None:
+            result = ClassifierResult(selected_agent=self.agents[agent_id], confidence=1.0)
+        else:
+            rule = "fallback"
+            result = await self.fallback.classify(input_text, chat_history)
+
+        if recorder.enabled:
+            recorder.record("router", rule, time.perf_counter() - start)
+        return result
+
+    def match(self, input_text, chat_history):
+        """
+        Applies the local rules.
+
+        :return: Tuple of (rule name, agent id), with agent id None if the turn is ambiguous
+        """
+        for pattern, agent_id in self._role_prefixes:
+            if pattern.match(input_text):
+                return "prefix", agent_id
+
+        scores = {
+            agent_id: sum(1 for pattern in patterns if pattern.search(input_text))
+            for agent_id, patterns in self.keyword_rules.items()
+            if agent_id in self.agents
+        }
+        best = None
+        if scores and max(scores.values()) > 0:
+            leaders = [agent_id for agent_id, score in scores.items() if score == max(scores.values())]
+            best = leaders[0] if len(leaders) == 1 else None
+
+        previous = self.previous_agent(chat_history)
+        if previous is not None:
+            if best is None or best == previous:
+                return "sticky", previous
+            return "ambiguous", None
+
+        if best is not None:
+            return "keyword", best
+        return "ambiguous", None
+
+    def previous_agent(self, chat_history):
+        """
+        Returns the id of the agent that answered the session's last turn, if known.
+        """
+        for message in reversed(chat_history or []):
+            if message.role != "assistant" or not message.content:
+                continue
+            found = HISTORY_AGENT_PREFIX.match(message.content[0].get("text", ""))
+            if found and found.group(1) in self.agents:
+                return found.group(1)
+            return None
+        return None
@@ -0,0 +1,374 @@
+'''
+Headless runner for the prompts in a day folder's script.txt
+
+Example:
+    python src/script_runner.py solved_work_Day5 solved_work_Day6 --concurrency 2
+    python src/script_runner.py work --client stub
+    python src/script_runner.py solved_work_Day6 --client stub --verify-replay
+'''
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+SECTION_HEADER = re.compile(r"^-{3,}\s*(.*?)\s*-{3,}$")
+ANSWER_MARKER = re.compile(r"^@{3,}\s*Correct Answer\s*(.*)$")
+NOTE_MARKER = re.compile(r"^@{3,}")
+# "*...*" and "**...**" annotations, up to the closing stars or the end of the line
+ANNOTATION = re.compile(r"\*{1,2}[^*]*(?:\*{1,2}|$)")
+# Model replies pasted into the script ("A: ...", "from claude: ...") were never prompts
+REPLY_LINE = re.compile(r"^(?:A|from claude)\s*:", re.IGNORECASE)
+NUMBER_LINE = re.compile(r"^-?\d+$")
+
+
+def parse_script(script_path):
+    """
+    Splits a script.txt into parts, each with its prompts and the recorded answer.
+
+    Prompts are the paragraphs (separated by blank lines) between a section header
+    such as "--------2024 Day 20 Pt 1---------" and its "@@@@@@ Correct Answer" line.
+    Other "@@@@@@" lines, "*...*" annotations, pasted replies and lines holding only a
+    number are notes and are not sent; a number next to a "Correct Answer" line without
+    a value is taken as the answer.
+
+    :param script_path: Path to script.txt
+    :return: List of {"title", "prompts", "expected_answer"} dictionaries
+    """
+    parts = []
+    current = None
+    paragraph = []
+    # Bare number seen since the last answer marker, and whether an empty
+    # "Correct Answer" line is still waiting for one
+    number = None
+    awaiting_answer = False
+
+    def flush():
+        if paragraph and current is not None:
+            current["prompts"].append(" ".join(line.strip() for line in paragraph))
+        paragraph.clear()
+
+    with open(script_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            header = SECTION_HEADER.match(line.strip())
+            answer = ANSWER_MARKER.match(line.strip())
+            if header:
+                flush()
+                current = {"title": header.group(1), "prompts": [], "expected_answer": None}
+                parts.append(current)
+                number, awaiting_answer = None, False
+            elif answer:
+                flush()
+                if current is not None:
+                    current["expected_answer"] = answer.group(1).strip() or number
+                    awaiting_answer = current["expected_answer"] is None
+                number = None
+            elif not line.strip() or NOTE_MARKER.match(line.strip()):
+                # Blank lines end a prompt; other @@@ notes (e.g. incorrect answers) are skipped
+                flush()
+                number = None
+            else:
+                text = ANNOTATION.sub("", line).strip()
+                if NUMBER_LINE.match(text):
+                    flush()
+                    if awaiting_answer:
+                        current["expected_answer"] = text
+                        awaiting_answer = False
+                    else:
+                        number = text
+                elif text and not REPLY_LINE.match(text):
+                    paragraph.append(text)
+    flush()
+
+    return parts
+
+
+def create_client(name, latency=0.0, endpoint_url=None, hedge=None, write_files=False):
+    """
+    Builds the model client for a run.
+
+    :param name: "bedrock" for the real service or "stub" for the offline StubBedrockClient
+    :param latency: Simulated per-call latency for the stub client
+    :param endpoint_url: Optional bedrock-runtime endpoint, e.g. a local stub_server.py
+    :param hedge: Optional hedging policy for the bedrock client: "p95" or seconds
+    :param write_files: Let the stub client answer "write" prompts with a file write
+    """
+    if name == "stub":
+        from stub_client import StubBedrockClient
+
+        # boto3 still builds (unused) default clients inside the orchestrator
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        return StubBedrockClient(latency=latency, write_files=write_files)
+
+    if endpoint_url:
+        os.environ["PUZZLER_BEDROCK_ENDPOINT"] = endpoint_url
+        # A local endpoint does not check signatures, but botocore still signs requests
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    if hedge:
+        os.environ["PUZZLER_HEDGE"] = hedge
+
+    from puzzler import UIClient
+
+    return UIClient.create_client()
+
+
+async def run_day(day_folder, client, parts=None, response_cache=None, fast_routing=True,
+                  history_policy=None, prefetch_context=True, stream_dir=None):
+    """
+    Runs every prompt of a day folder's script.txt through a fresh orchestrator.
+
+    :param day_folder: Folder containing script.txt, 01_PUZZLE and 02_PUZZLE_SOLUTION
+    :param client: bedrock-runtime compatible client
+    :param parts: Optional list of part titles to run; runs all parts when omitted
+    :param response_cache: Optional ResponseCache shared by all days
+    :param fast_routing: Route unambiguous prompts without the LLM classifier
+    :param history_policy: Optional HistoryPolicy bounding the conversation sent per call
+    :param prefetch_context: Attach the preloaded solution folder files to the Software
+        Engineer's requests
+    :param stream_dir: Optional directory for a "<day>.log" of the streamed tokens; without
+        it the day's streamed tokens are discarded rather than printed
+    :return: List of step records
+    """
+    from puzzler import TokenSink, UIClient, current_token_sink
+    from multi_agent_orchestrator.types import ConversationMessage
+
+    ui_client = UIClient(
+        work_folder=day_folder,
+        client=client,
+        response_cache=response_cache,
+        fast_routing=fast_routing,
+        history_policy=history_policy,
+        prefetch_context=prefetch_context,
+    )
+    day_name = os.path.basename(os.path.normpath(day_folder))
+    session_id = f"batch-{day_name}"
+    steps = []
+
+    # Each day streams into its own sink so parallel days never share stdout
+    stream_log = None
+    if stream_dir:
+        os.makedirs(stream_dir, exist_ok=True)
+        stream_log = open(os.path.join(stream_dir, f"{day_name}.log"), "w", encoding="utf-8")
+    sink = TokenSink([stream_log.write] if stream_log else [])
+    current_token_sink.set(sink)
+
+    try:
+        for part in parse_script(os.path.join(day_folder, "script.txt")):
+            if parts and part["title"] not in parts:
+                continue
+            for index, prompt in enumerate(part["prompts"]):
+                if stream_log:
+                    stream_log.write(f"\n===== [{part['title']} #{index}] {prompt}\n\n")
+                start = time.perf_counter()
+                response = await ui_client.route_request(prompt, "batch", session_id)
+                sink.flush()
+                output = response.output
+                if isinstance(output, ConversationMessage):
+                    output = " ".join(block.get("text", "") for block in output.content)
+                steps.append({
+                    "day": day_folder,
+                    "part": part["title"],
+                    "step": index,
+                    "agent": response.metadata.agent_name,
+                    "prompt": prompt,
+                    "response": output,
+                    "expected_answer": part["expected_answer"],
+                    "seconds": round(time.perf_counter() - start, 3),
+                })
+    finally:
+        sink.flush()
+        if stream_log:
+            stream_log.close()
+
+    return steps
+
+
+def run_days(day_folders, client, concurrency=4, parts=None, response_cache=None,
+             fast_routing=True, history_policy=None, prefetch_context=True, stream_dir=None):
+    """
+    Runs several day folders in parallel, at most `concurrency` at a time.
+
+    Each day gets its own thread and event loop because the Bedrock converse call
+    blocks; the file tools' thread pool is shared across all of them.
+
+    :return: Dictionary of day folder to its step records, or to an error string
+    """
+    def run(day_folder):
+        try:
+            return asyncio.run(
+                run_day(day_folder, client, parts, response_cache, fast_routing, history_policy,
+                        prefetch_context, stream_dir)
+            )
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="day") as executor:
+        return dict(zip(day_folders, executor.map(run, day_folders)))
+
+
+class ReplayOnlyClient:
+    '''
+    Model client for the replay pass of verify_replay: every response must come from the cache
+    '''
+
+    def converse(self, **kwargs):
+        raise RuntimeError("Model called during replay")
+
+    converse_stream = converse
+
+
+def verify_replay(day_folders, client, parts=None, fast_routing=True, history_policy=None,
+                  prefetch_context=True):
+    """
+    Records each day on a scratch copy, then replays it from the recordings on a fresh copy
+    at the same path and compares the responses.
+
+    Tools run again during the replay, so files are rewritten with new mtimes; the check
+    fails if any tool result no longer matches the recorded request.
+
+    :param client: Model client for the recording pass
+    :return: List of problem descriptions; empty when every day replays identically
+    """
+    from tools.response_cache import ResponseCache
+
+    problems = []
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = ResponseCache(os.path.join(scratch, "cache"), "record")
+        for day_folder in day_folders:
+            work_folder = os.path.join(scratch, os.path.basename(os.path.normpath(day_folder)))
+            runs = []
+            for mode, model_client in (("record", client), ("replay", ReplayOnlyClient())):
+                cache.mode = mode
+                shutil.rmtree(work_folder, ignore_errors=True)
+                shutil.copytree(day_folder, work_folder)
+                try:
+                    runs.append(asyncio.run(run_day(
+                        work_folder, model_client, parts, cache, fast_routing, history_policy,
+                        prefetch_context,
+                    )))
+                except Exception as e:
+                    problems.append(f"{day_folder}: {mode} failed ({type(e).__name__}: {e})")
+                    break
+            if len(runs) < 2:
+                continue
+            recorded, replayed = runs
+            for before, after in zip(recorded, replayed):
+                if before["response"] != after["response"]:
+                    problems.append(f"{day_folder}: [{before['part']} #{before['step']}] response differs")
+            if len(recorded) != len(replayed):
+                problems.append(f"{day_folder}: {len(recorded)} steps recorded, {len(replayed)} replayed")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run script.txt prompts without the gradio UI")
+    parser.add_argument("day_folders", nargs="+", help="Folders such as work or solved_work_Day5")
+    parser.add_argument("--concurrency", type=int, default=4, help="Days to run at the same time")
+    parser.add_argument("--client", choices=["bedrock", "stub"], default="bedrock")
+    parser.add_argument("--stub-latency", type=float, default=0.0,
+                        help="Seconds of simulated latency per stub model call")
+    parser.add_argument("--endpoint-url", help="bedrock-runtime endpoint, e.g. a local stub_server.py")
+    parser.add_argument("--hedge", help="Hedge slow model calls: 'p95' or a fixed delay in seconds")
+    parser.add_argument("--part", action="append", dest="parts",
+                        help="Only run the named part (e.g. '2024 Day 5 Pt 1'); may be repeated")
+    parser.add_argument("--output", help="Write step records as JSON lines to this file")
+    parser.add_argument("--stream-dir",
+                        help="Write each day's streamed model output to <day>.log in this directory")
+    parser.add_argument("--no-fast-routing", action="store_true",
+                        help="Send every prompt through the LLM classifier")
+    parser.add_argument("--cache-mode", choices=["record", "replay", "auto", "bypass"],
+                        help="Record or replay model responses (default: PUZZLER_CACHE_MODE or bypass)")
+    parser.add_argument("--cache-dir", default=".response_cache", help="Directory for recorded responses")
+    parser.add_argument("--max-history-tokens", type=int, default=24000,
+                        help="Estimated token budget for the conversation sent on each model call")
+    parser.add_argument("--summarize-history", action="store_true",
+                        help="Outline dropped turns in the first kept prompt instead of discarding them")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="Let the Software Engineer read Solution.md and its inputs through tools")
+    parser.add_argument("--verify-replay", action="store_true",
+                        help="Record each day on a scratch copy, replay it from the recordings and compare")
+    parser.add_argument("--import-report", action="store_true",
+                        help="Print how long the deferred imports took")
+    parser.add_argument("--trace", help="Write model, tool and routing timings as JSON lines to this file")
+    parser.add_argument("--metrics", help="Write a Prometheus text snapshot of the timings to this file")
+    args = parser.parse_args()
+
+    if args.trace or args.metrics:
+        from tools.instrumentation import recorder
+
+        recorder.configure(args.trace, args.metrics)
+
+    from tools.response_cache import ResponseCache
+
+    response_cache = ResponseCache.from_env()
+    if args.cache_mode and args.cache_mode != "bypass":
+        response_cache = ResponseCache(args.cache_dir, args.cache_mode)
+
+    from tools.history_policy import HistoryPolicy, outline_summary
+
+    history_policy = HistoryPolicy(
+        max_tokens=args.max_history_tokens,
+        summarizer=outline_summary if args.summarize_history else None,
+    )
+
+    client = create_client(
+        args.client, args.stub_latency, args.endpoint_url, args.hedge, write_files=args.verify_replay
+    )
+    if args.verify_replay:
+        problems = verify_replay(
+            args.day_folders, client, args.parts,
+            fast_routing=not args.no_fast_routing,
+            history_policy=history_policy,
+            prefetch_context=not args.no_prefetch,
+        )
+        for problem in problems:
+            print(f"REPLAY MISMATCH {problem}")
+        print(f"Replay {'failed' if problems else 'matched'} for {len(args.day_folders)} day(s)")
+        sys.exit(1 if problems else 0)
+
+    results = run_days(
+        args.day_folders, client, args.concurrency, args.parts, response_cache,
+        fast_routing=not args.no_fast_routing,
+        history_policy=history_policy,
+        prefetch_context=not args.no_prefetch,
+        stream_dir=args.stream_dir,
+    )
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    failed = False
+    for day_folder, steps in results.items():
+        if isinstance(steps, str):
+            failed = True
+            print(f"{day_folder}: FAILED {steps}")
+            continue
+        total = sum(step["seconds"] for step in steps)
+        print(f"{day_folder}: {len(steps)} steps in {total:.1f}s")
+        for step in steps:
+            print(f"  [{step['part']} #{step['step']}] {step['agent']} ({step['seconds']}s)")
+            if output:
+                output.write(json.dumps(step) + "\n")
+    if output:
+        output.close()
+
+    if args.metrics:
+        recorder.write_snapshot()
+
+    if args.import_report:
+        from puzzler import print_import_report
+
+        print_import_report()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
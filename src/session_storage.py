@@ -0,0 +1,93 @@
+'''
+Chat history storage that keeps every session in its own store
+'''
+import threading
+
+from collections import OrderedDict
+from typing import List, Optional
+
+from multi_agent_orchestrator.storage import ChatStorage, InMemoryChatStorage
+from multi_agent_orchestrator.types import ConversationMessage
+
+
+class SessionChatStorage(ChatStorage):
+    '''
+    Gives each (user, session) pair its own InMemoryChatStorage and turn lock
+
+    Sessions never see each other's history, and looking up a session's messages
+    does not scan every other session.  The least recently used idle sessions are
+    dropped once more than max_sessions are active; a session in the middle of a turn
+    (its turn lock held) is never dropped, so it may briefly exceed max_sessions.
+    '''
+
+    def __init__(self, max_sessions: int = 64):
+        """
+        :param max_sessions: Number of sessions to keep history for
+        """
+        super().__init__()
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session(self, user_id: str, session_id: str):
+        """
+        Returns the (storage, turn lock) pair for a session, creating it if needed.
+        """
+        key = (user_id, session_id)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = (InMemoryChatStorage(), threading.Lock())
+                self._sessions[key] = entry
+                self._evict()
+            else:
+                self._sessions.move_to_end(key)
+            return entry
+
+    def _evict(self):
+        """
+        Drops least recently used sessions beyond max_sessions, skipping busy ones.
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        idle = [
+            key for key, (_, turn_lock) in self._sessions.items() if not turn_lock.locked()
+        ]
+        for key in idle[:excess]:
+            del self._sessions[key]
+
+    def turn_lock(self, user_id: str, session_id: str) -> threading.Lock:
+        """
+        Lock held for the duration of a turn so one session's turns never interleave.
+        """
+        return self.session(user_id, session_id)[1]
+
+    def drop_session(self, user_id: str, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop((user_id, session_id), None)
+
+    async def save_chat_message(self,
+                                user_id: str,
+                                session_id: str,
+                                agent_id: str,
+                                new_message: ConversationMessage,
+                                max_history_size: Optional[int] = None) -> List[ConversationMessage]:
+        storage = self.session(user_id, session_id)[0]
+        return await storage.save_chat_message(
+            user_id, session_id, agent_id, new_message, max_history_size
+        )
+
+    async def fetch_chat(self,
+                         user_id: str,
+                         session_id: str,
+                         agent_id: str,
+                         max_history_size: Optional[int] = None) -> List[ConversationMessage]:
+        storage = self.session(user_id, session_id)[0]
+        return await storage.fetch_chat(user_id, session_id, agent_id, max_history_size)
+
+    async def fetch_all_chats(self,
+                              user_id: str,
+                              session_id: str) -> List[ConversationMessage]:
+        storage = self.session(user_id, session_id)[0]
+        return await storage.fetch_all_chats(user_id, session_id)
@@ -0,0 +1,124 @@
+'''
+Offline stand-in for the bedrock-runtime client used by the agents and classifier
+'''
+import json
+import re
+import time
+import uuid
+
+
+class StubBedrockClient:
+    '''
+    Answers converse() calls locally so scripted runs can be exercised without AWS.
+
+    Both converse() and converse_stream() are supported.  Classifier requests are routed
+    by the role named in the prompt ("As the Software Engineer" / "As the puzzle solver").
+    Agent requests that ask to read files make one metadata-only File_Reading_Tool call
+    against the agent's input folder before replying, so the tool handler is exercised
+    as well.  With write_files, requests that ask to write save the prompt to
+    stub_notes.md in the agent's input folder instead.
+    '''
+
+    def __init__(self, latency=0.0, write_files=False):
+        """
+        :param latency: Seconds to sleep per call, to imitate model response time
+        :param write_files: Answer "write" prompts with a File_Writing_Tool call
+        """
+        self.latency = latency
+        self.write_files = write_files
+        self.calls = 0
+
+    def converse(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        messages = kwargs.get("messages", [])
+        system_prompt = " ".join(block.get("text", "") for block in kwargs.get("system", []))
+        tool_config = kwargs.get("toolConfig") or {}
+
+        if tool_config.get("toolChoice", {}).get("tool", {}).get("name") == "analyzePrompt":
+            return self._response(self._classify(messages), messages)
+
+        last = messages[-1]["content"] if messages else []
+        if any("toolResult" in block for block in last):
+            return self._response([{"text": "[stub] Finished reviewing the files."}], messages)
+
+        text = " ".join(block.get("text", "") for block in last)
+        folder = re.search(r"input folder (\S+)", system_prompt)
+        if tool_config and folder and self.write_files and "write" in text.lower():
+            tool_use = {
+                "toolUseId": f"stub-{uuid.uuid4().hex[:12]}",
+                "name": "File_Writing_Tool",
+                "input": {
+                    "directory_path": folder.group(1),
+                    "file_name": "stub_notes.md",
+                    "file_content": text[:200],
+                },
+            }
+            return self._response([{"toolUse": tool_use}], messages, stop_reason="tool_use")
+        if tool_config and folder and "read" in text.lower():
+            tool_use = {
+                "toolUseId": f"stub-{uuid.uuid4().hex[:12]}",
+                "name": "File_Reading_Tool",
+                "input": {"directory_path": folder.group(1), "metadata_only": True},
+            }
+            return self._response([{"toolUse": tool_use}], messages, stop_reason="tool_use")
+
+        return self._response([{"text": f"[stub] {text[:200]}"}], messages)
+
+    def converse_stream(self, **kwargs):
+        """
+        Replays the converse() reply as a Bedrock ConverseStream event sequence,
+        splitting text into word-sized deltas.
+        """
+        response = self.converse(**kwargs)
+        return {"stream": self._events(response)}
+
+    @staticmethod
+    def _events(response):
+        yield {"messageStart": {"role": "assistant"}}
+        for index, block in enumerate(response["output"]["message"]["content"]):
+            if "toolUse" in block:
+                tool_use = block["toolUse"]
+                yield {"contentBlockStart": {"contentBlockIndex": index, "start": {
+                    "toolUse": {"toolUseId": tool_use["toolUseId"], "name": tool_use["name"]}
+                }}}
+                yield {"contentBlockDelta": {"contentBlockIndex": index, "delta": {
+                    "toolUse": {"input": json.dumps(tool_use["input"])}
+                }}}
+            else:
+                for word in re.findall(r"\S*\s*", block["text"]):
+                    if word:
+                        yield {"contentBlockDelta": {"contentBlockIndex": index, "delta": {"text": word}}}
+            yield {"contentBlockStop": {"contentBlockIndex": index}}
+        yield {"messageStop": {"stopReason": response["stopReason"]}}
+        yield {"metadata": {"usage": response["usage"], "metrics": response["metrics"]}}
+
+    @staticmethod
+    def _classify(messages):
+        text = " ".join(
+            block.get("text", "") for block in (messages[-1]["content"] if messages else [])
+        )
+        agent = "software-engineer" if "software engineer" in text.lower() else "puzzle-solver"
+        return [{
+            "toolUse": {
+                "toolUseId": f"stub-{uuid.uuid4().hex[:12]}",
+                "name": "analyzePrompt",
+                "input": {"userinput": text, "selected_agent": agent, "confidence": 1.0},
+            }
+        }]
+
+    def _response(self, content, messages, stop_reason="end_turn"):
+        input_tokens = len(json.dumps(messages, default=str)) // 4
+        output_tokens = len(json.dumps(content)) // 4
+        return {
+            "output": {"message": {"role": "assistant", "content": content}},
+            "stopReason": stop_reason,
+            "usage": {
+                "inputTokens": input_tokens,
+                "outputTokens": output_tokens,
+                "totalTokens": input_tokens + output_tokens,
+            },
+            "metrics": {"latencyMs": int(self.latency * 1000)},
+        }
@@ -0,0 +1,163 @@
+'''
+Local HTTP endpoint that speaks the Bedrock Converse API, for exercising the real boto3
+client (connection pooling, retries, hedging) offline
+
+Replies come from StubBedrockClient.  Latency, slow outliers and throttling errors can be
+injected to imitate a loaded service.
+
+Example:
+    python src/stub_server.py --port 8765 --latency 0.2 --slow-fraction 0.05 --slow-latency 5
+    python src/script_runner.py work --endpoint-url http://127.0.0.1:8765 --hedge p95
+'''
+import argparse
+import binascii
+import json
+import random
+import re
+import struct
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stub_client import StubBedrockClient
+
+ROUTE = re.compile(r"^/model/(?P<model>[^/]+)/(?P<operation>converse|converse-stream)$")
+
+
+def encode_event(event_type, payload):
+    """
+    Frames one ConverseStream event in the AWS event stream binary format.
+    """
+    headers = b""
+    for name, value in ((":event-type", event_type),
+                        (":content-type", "application/json"),
+                        (":message-type", "event")):
+        name, value = name.encode(), value.encode()
+        # Header value type 7 is a string
+        headers += struct.pack(">B", len(name)) + name + struct.pack(">BH", 7, len(value)) + value
+    body = json.dumps(payload).encode()
+    total_length = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack(">II", total_length, len(headers))
+    message = prelude + struct.pack(">I", binascii.crc32(prelude)) + headers + body
+    return message + struct.pack(">I", binascii.crc32(message))
+
+
+class StubBedrockServer(ThreadingHTTPServer):
+    '''
+    Threaded HTTP server answering /model/{id}/converse and /model/{id}/converse-stream
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, slow_fraction=0.0,
+                 slow_latency=0.0, error_rate=0.0, seed=None):
+        """
+        :param address: (host, port) to listen on; port 0 picks a free port
+        :param latency: Seconds before every response starts
+        :param slow_fraction: Share of requests that take slow_latency instead
+        :param slow_latency: Seconds before a slow response starts
+        :param error_rate: Share of requests answered with a ThrottlingException
+        :param seed: Optional seed for repeatable delay and error injection
+        """
+        super().__init__(address, _Handler)
+        self.stub = StubBedrockClient()
+        self.latency = latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serves from a background thread and returns the server.
+        """
+        threading.Thread(target=self.serve_forever, name="stub-bedrock", daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # Clients close losing hedged streams early; that is expected, not an error
+        pass
+
+    def draw(self):
+        """
+        Picks this request's delay and whether it fails.
+        """
+        with self._lock:
+            self.requests += 1
+            slow = self._random.random() < self.slow_fraction
+            failed = self._random.random() < self.error_rate
+        return (self.slow_latency if slow else self.latency), failed
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        route = ROUTE.match(self.path.split("?")[0])
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not route:
+            return self._json(404, {"message": f"Unknown path {self.path}"}, "ResourceNotFoundException")
+
+        delay, failed = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self._json(429, {"message": "Too many requests"}, "ThrottlingException")
+
+        request = {"modelId": route.group("model"), **body}
+        if route.group("operation") == "converse":
+            return self._json(200, self.server.stub.converse(**request))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in self.server.stub.converse_stream(**request)["stream"]:
+            (event_type, payload), = event.items()
+            frame = encode_event(event_type, payload)
+            self.wfile.write(f"{len(frame):x}\r\n".encode() + frame + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _json(self, status, payload, error_type=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if error_type:
+            self.send_header("x-amzn-ErrorType", error_type)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the stub model over the Bedrock Converse API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Share of slow responses")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Seconds before a slow response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of throttled responses")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = StubBedrockServer(
+        (args.host, args.port), args.latency, args.slow_fraction, args.slow_latency,
+        args.error_rate, args.seed,
+    )
+    print(f"Stub Bedrock endpoint on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
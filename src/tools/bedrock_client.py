@@ -0,0 +1,191 @@
+'''
+bedrock-runtime client factory with connection-pool sizing, adaptive retries and optional
+hedged requests
+
+Environment overrides, used by UIClient.create_client:
+- PUZZLER_BEDROCK_ENDPOINT: endpoint URL, e.g. a local stub_server.py
+- PUZZLER_BEDROCK_POOL: maximum pooled connections
+- PUZZLER_HEDGE: "p95" to hedge after the observed 95th percentile latency, or a number
+  of seconds to hedge after a fixed delay
+'''
+import math
+import os
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .instrumentation import recorder
+
+DEFAULT_POOL_CONNECTIONS = 32
+
+
+def create_bedrock_client(endpoint_url=None, region_name=None,
+                          max_pool_connections=DEFAULT_POOL_CONNECTIONS, connect_timeout=5,
+                          read_timeout=300, retry_mode="adaptive", max_attempts=5):
+    """
+    Builds a bedrock-runtime client.
+
+    :param endpoint_url: Optional endpoint, e.g. http://127.0.0.1:8765 for stub_server.py
+    :param region_name: AWS region; defaults to the session's
+    :param max_pool_connections: Keep-alive connections shared by concurrent calls; should
+        cover the agents, classifier and hedges that can be in flight at once
+    :param connect_timeout: Seconds to establish a connection
+    :param read_timeout: Seconds to wait for response bytes.  Claude likes to think about
+        it, so this is longer than the boto3 default of 60s
+    :param retry_mode: botocore retry mode; "adaptive" also rate limits on throttling
+    :param max_attempts: Attempts per call, including the first
+    """
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={"mode": retry_mode, "max_attempts": max_attempts},
+        tcp_keepalive=True,
+    )
+    return boto3.Session().client(
+        "bedrock-runtime", config=config, endpoint_url=endpoint_url, region_name=region_name
+    )
+
+
+def client_from_env():
+    """
+    Builds a client (hedged if PUZZLER_HEDGE is set) from the PUZZLER_BEDROCK_* variables.
+    """
+    pool = int(os.environ.get("PUZZLER_BEDROCK_POOL", DEFAULT_POOL_CONNECTIONS))
+    client = create_bedrock_client(
+        endpoint_url=os.environ.get("PUZZLER_BEDROCK_ENDPOINT"), max_pool_connections=pool
+    )
+    hedge = os.environ.get("PUZZLER_HEDGE")
+    if not hedge:
+        return client
+    return HedgedClient(client, hedge_after=None if hedge == "p95" else float(hedge), max_workers=pool)
+
+
+class HedgedClient:
+    '''
+    Wraps a bedrock-runtime client so a call that is slower than usual gets a second,
+    identical request, and whichever answers first is used
+
+    The hedge delay is the `quantile` of recent single-call latencies (time until the
+    response, or until the stream starts for converse_stream), so about 1 - quantile of
+    calls are duplicated.  Until min_samples calls have been seen, nothing is hedged
+    unless a fixed hedge_after is given.
+    '''
+
+    def __init__(self, client, hedge_after=None, quantile=0.95, min_samples=20, window=200,
+                 max_workers=DEFAULT_POOL_CONNECTIONS):
+        """
+        :param client: bedrock-runtime compatible client
+        :param hedge_after: Fixed hedge delay in seconds; overrides the observed quantile
+        :param quantile: Latency quantile used as the hedge delay
+        :param min_samples: Calls to observe before hedging on the quantile
+        :param window: Number of recent latencies kept
+        :param max_workers: Threads for in-flight calls (primaries and hedges)
+        """
+        self._client = client
+        self.hedge_after = hedge_after
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock")
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def converse(self, **kwargs):
+        return self._call("converse", kwargs)
+
+    def converse_stream(self, **kwargs):
+        return self._call("converse_stream", kwargs)
+
+    def hedge_delay(self):
+        """
+        Seconds to wait for the first request before sending a hedge, or None to not hedge.
+        """
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[max(0, math.ceil(self.quantile * len(samples)) - 1)]
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "samples": len(self._latencies),
+                "hedge_delay": delay,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+    def _call(self, operation, kwargs):
+        method = getattr(self._client, operation)
+        delay = self.hedge_delay()
+        start = time.perf_counter()
+
+        if delay is None:
+            response = method(**kwargs)
+            seconds = time.perf_counter() - start
+            self._observe(seconds)
+            if recorder.enabled:
+                recorder.record("client", operation, seconds, hedged=0, hedge_won=0)
+            return response
+
+        primary = self._executor.submit(method, **kwargs)
+        # Latency samples come from primaries only, so hedging does not skew its own delay
+        primary.add_done_callback(
+            lambda future: self._observe(time.perf_counter() - start)
+            if future.exception() is None else None
+        )
+        futures = [primary]
+        if not wait(futures, timeout=delay).done:
+            with self._lock:
+                self.hedges += 1
+            futures.append(self._executor.submit(method, **kwargs))
+
+        winner = None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+        if winner is None:
+            raise primary.exception()
+
+        hedged = len(futures) > 1
+        if winner is not primary:
+            with self._lock:
+                self.hedge_wins += 1
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_close_stream)
+        if recorder.enabled:
+            recorder.record(
+                "client", operation, time.perf_counter() - start,
+                hedged=int(hedged), hedge_won=int(winner is not primary),
+            )
+        return winner.result()
+
+    def _observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+
+def _close_stream(future):
+    """
+    Releases the connection held by a losing converse_stream call.
+    """
+    if future.exception() is not None:
+        return
+    stream = future.result().get("stream")
+    if hasattr(stream, "close"):
+        stream.close()
@@ -0,0 +1,224 @@
+'''
+Speculative prefetch of the files the next agent is known to read first
+
+In every script.txt flow the Puzzle Solver writes Solution.md to 02_PUZZLE_SOLUTION, and
+the Software Engineer's first move is to read Solution.md, index.base.ts and input.txt
+from that folder.  ContextPrefetcher watches the file tools' writes and, as soon as
+Solution.md is written, reads those files in the background into a context bundle.
+ContextBundleClient attaches the bundle to the Software Engineer's requests, so its turn
+starts without any File_Reading_Tool round trips.
+
+A bundle is rebuilt only when one of its files changes content: files whose size and
+mtime are unchanged are not re-read, and a re-read file whose sha256 is unchanged keeps
+the rendered bundle.
+'''
+import copy
+import hashlib
+import os
+import threading
+import time
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import filesystem_tool
+from .history_policy import estimate_tokens
+from .instrumentation import recorder
+
+# Writing one of these starts a prefetch of its folder
+TRIGGER_FILES = ("Solution.md",)
+
+# Bundled in this order, as far as max_bytes allows
+BUNDLE_FILES = ("Solution.md", "index.base.ts", "index.ts", "input.txt")
+
+# The bundle goes into every request and counts against the history budget, so it is
+# kept to about half of the default HistoryPolicy budget (24000 tokens)
+DEFAULT_BUNDLE_BYTES = 48 * 1024
+
+
+class ContextPrefetcher:
+    '''
+    Builds and caches one context bundle per folder
+    '''
+
+    def __init__(self, file_names=BUNDLE_FILES, trigger_names=TRIGGER_FILES,
+                 max_bytes=DEFAULT_BUNDLE_BYTES):
+        """
+        :param file_names: Files bundled from a folder, when present
+        :param trigger_names: Files whose writes start a prefetch of their folder
+        :param max_bytes: Content bytes per bundle; files that do not fit are only listed
+        """
+        self.file_names = file_names
+        self.trigger_names = trigger_names
+        self.max_bytes = max_bytes
+        self.builds = 0
+        self.hits = 0
+        self._bundles = {}
+        self._lock = threading.Lock()
+        self._folder_locks = defaultdict(threading.Lock)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def on_write(self, file_path):
+        """
+        filesystem_tool write listener: prefetches the folder of a written trigger file,
+        and refreshes an existing bundle when one of its files is written.
+        """
+        folder, name = os.path.split(file_path)
+        with self._lock:
+            bundled = folder in self._bundles
+        if name in self.trigger_names or (bundled and name in self.file_names):
+            self._executor.submit(self.get, folder)
+
+    def get(self, folder):
+        """
+        Returns the current bundle for a folder, or None if no trigger file exists there.
+
+        :return: {"folder", "digest", "files", "text"} dictionary
+        """
+        folder = os.path.abspath(folder)
+        start = time.perf_counter()
+        with self._folder_locks[folder]:
+            with self._lock:
+                previous = self._bundles.get(folder)
+            if not any(os.path.isfile(os.path.join(folder, name)) for name in self.trigger_names):
+                with self._lock:
+                    self._bundles.pop(folder, None)
+                return None
+
+            files = self._read_files(folder, previous["files"] if previous else {})
+            digest = hashlib.sha256("".join(
+                f"{name}:{entry['sha256']}\n" for name, entry in files.items()
+            ).encode("utf-8")).hexdigest()
+
+            hit = previous is not None and previous["digest"] == digest
+            if hit:
+                bundle = {**previous, "files": files}
+            else:
+                bundle = {
+                    "folder": folder,
+                    "digest": digest,
+                    "files": files,
+                    "text": self._render(folder, files),
+                }
+            with self._lock:
+                self._bundles[folder] = bundle
+                if hit:
+                    self.hits += 1
+                else:
+                    self.builds += 1
+
+        if recorder.enabled:
+            recorder.record(
+                "prefetch", folder, time.perf_counter() - start,
+                hit=int(hit), bytes=len(bundle["text"]),
+            )
+        return bundle
+
+    def stats(self):
+        with self._lock:
+            return {"bundles": len(self._bundles), "builds": self.builds, "hits": self.hits}
+
+    def _read_files(self, folder, previous):
+        """
+        Reads the bundle files present in a folder, reusing entries whose stat is unchanged.
+        """
+        files = {}
+        for name in self.file_names:
+            file_path = os.path.join(folder, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            key = (stat.st_size, stat.st_mtime_ns)
+            entry = previous.get(name)
+            if entry is not None and entry["stat"] == key:
+                files[name] = entry
+                continue
+
+            content = filesystem_tool.file_cache.get(file_path, stat)
+            if content is None:
+                with open(file_path, "rb") as f:
+                    content = f.read()
+                filesystem_tool.file_cache.put(file_path, stat, content)
+            files[name] = {
+                "stat": key,
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "content": content,
+            }
+        return files
+
+    def _render(self, folder, files):
+        """
+        Formats the bundle in the File_Reading_Tool result format, so each header carries
+        the sha256 to pass as base_sha256 for edits.  Files that do not fit are listed
+        without their contents.
+        """
+        blocks = []
+        remaining = self.max_bytes
+        for name, entry in files.items():
+            file_path = os.path.join(folder, name)
+            text = entry["content"].decode("utf-8", errors="replace")
+            if entry["size"] > remaining or len(text.encode("utf-8")) != entry["size"]:
+                blocks.append((file_path, f"size {entry['size']}, sha256 {entry['sha256']}, "
+                                          "not preloaded; read it with the tools if needed", None))
+                continue
+            remaining -= entry["size"]
+            blocks.append((file_path, f"{entry['size']} bytes, sha256 {entry['sha256']}", text))
+        return (
+            f"The following files from {folder} are preloaded and current as of this message. "
+            "Do not read them again with File_Reading_Tool.\n\n"
+            + filesystem_tool.encode_file_blocks(blocks)
+        )
+
+
+context_prefetcher = ContextPrefetcher()
+filesystem_tool.write_listeners.append(context_prefetcher.on_write)
+
+
+class ContextBundleClient:
+    '''
+    Wraps a bedrock-runtime client so every request starts with the folder's context bundle
+
+    The bundle is added as the first block of the first message.  It is not stored in
+    the chat history, so each call carries the current version of the files.  Wrap this
+    client in a HistoryPolicyClient with reserved_tokens=self.reserved_tokens so the
+    bundle counts against the history budget.
+    '''
+
+    def __init__(self, client, folder, prefetcher=None):
+        """
+        :param client: bedrock-runtime compatible client
+        :param folder: Folder whose bundle is attached (the agent's input folder)
+        :param prefetcher: ContextPrefetcher; defaults to the module's shared instance
+        """
+        self._client = client
+        self._folder = folder
+        self._prefetcher = prefetcher or context_prefetcher
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def converse(self, **kwargs):
+        return self._client.converse(**self._attach(kwargs))
+
+    def converse_stream(self, **kwargs):
+        return self._client.converse_stream(**self._attach(kwargs))
+
+    def reserved_tokens(self):
+        """
+        Estimated tokens the bundle adds to the next request.
+        """
+        bundle = self._prefetcher.get(self._folder)
+        return estimate_tokens([{"text": bundle["text"]}]) if bundle else 0
+
+    def _attach(self, kwargs):
+        messages = kwargs.get("messages")
+        if not messages:
+            return kwargs
+        bundle = self._prefetcher.get(self._folder)
+        if bundle is None:
+            return kwargs
+        first = copy.copy(messages[0])
+        first["content"] = [{"text": bundle["text"]}, *first.get("content", [])]
+        return {**kwargs, "messages": [first, *messages[1:]]}
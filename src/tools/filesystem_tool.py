@@ -1,10 +1,30 @@
+import asyncio
+import base64
+import contextlib
+import fnmatch
+import functools
+import hashlib
 import json
+import mmap
 import os
+import re
 import shutil
+import tempfile
+import threading
+import time
 
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from multi_agent_orchestrator.types import ConversationMessage, ParticipantRole
 
+from .instrumentation import recorder
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 filesystem_tools_description = [
     {
         "toolSpec": {
@@ -25,9 +45,51 @@ filesystem_tools_description = [
                         },
                         "file_pattern": {
                             "type": "string",
-                            "description": "Optional pattern to filter files (e.g., '*.txt')",
+                            "description": "Optional glob pattern to filter files (e.g., '*.txt' or 'index.*.ts'). Patterns containing '/' match the path relative to directory_path.",
                             "default": "*",
                         },
+                        "metadata_only": {
+                            "type": "boolean",
+                            "description": "List matching files with their size and modified time, without contents.",
+                            "default": False,
+                        },
+                        "start_line": {
+                            "type": "integer",
+                            "description": "Optional 1-based first line to return from each file.",
+                        },
+                        "end_line": {
+                            "type": "integer",
+                            "description": "Optional 1-based last line (inclusive) to return from each file.",
+                        },
+                        "byte_offset": {
+                            "type": "integer",
+                            "description": "Optional byte offset to start reading each file from. Cannot be combined with line ranges.",
+                        },
+                        "byte_length": {
+                            "type": "integer",
+                            "description": "Optional number of bytes to read from byte_offset.",
+                        },
+                        "max_bytes": {
+                            "type": "integer",
+                            "description": "Maximum number of content bytes returned by this call across all files.",
+                            "default": 131072,
+                        },
+                        "cursor": {
+                            "type": "string",
+                            "description": "Continuation cursor returned as next_cursor by a previous truncated read.",
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": ["text", "json"],
+                            "description": "text returns each file's raw contents under a '==> path <== N bytes, ...' header, "
+                            "sending identical contents once; json returns a file_data JSON string.",
+                            "default": "text",
+                        },
+                        "skip_unchanged": {
+                            "type": "boolean",
+                            "description": "Omit the contents of whole files already read in this conversation that have not changed since.",
+                            "default": False,
+                        },
                     },
                     "required": ["directory_path"],
                 }
@@ -37,7 +99,8 @@ filesystem_tools_description = [
     {
         "toolSpec": {
             "name": "File_Writing_Tool",
-            "description": "Create or overwrite a file to a specified directory with the provided contents.",
+            "description": "Create or overwrite a file to a specified directory with the provided contents, "
+            "or modify an existing file with search/replace edits or a unified diff.",
             "inputSchema": {
                 "json": {
                     "type": "object",
@@ -49,11 +112,31 @@ filesystem_tools_description = [
                         "file_name": {"type": "string", "description": "The filename."},
                         "file_content": {
                             "type": "string",
-                            "description": "Whether to recursively list files in subdirectories.",
-                            "default": False,
+                            "description": "The complete contents to write to the file.",
+                        },
+                        "edits": {
+                            "type": "array",
+                            "description": "Search/replace edits applied in order to the current file. "
+                            "Each search string must match exactly once.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "search": {"type": "string"},
+                                    "replace": {"type": "string"},
+                                },
+                                "required": ["search", "replace"],
+                            },
+                        },
+                        "patch": {
+                            "type": "string",
+                            "description": "A unified diff to apply to the current file.",
+                        },
+                        "base_sha256": {
+                            "type": "string",
+                            "description": "Optional sha256 of the file as last read; the write is rejected if the file has changed since.",
                         },
                     },
-                    "required": ["directory_path", "file_name", "file_content"],
+                    "required": ["directory_path", "file_name"],
                 }
             },
         }
@@ -61,7 +144,8 @@ filesystem_tools_description = [
     {
         "toolSpec": {
             "name": "File_Copy_Tool",
-            "description": "Copy a file to a specified directory, overwriting it if already present.",
+            "description": "Copy a file to a specified directory, overwriting it if already present. "
+            "The copy is skipped if the destination already has identical contents.",
             "inputSchema": {
                 "json": {
                     "type": "object",
@@ -79,6 +163,33 @@ filesystem_tools_description = [
                 }
             },
         }
+    },
+    {
+        "toolSpec": {
+            "name": "Input_Profile_Tool",
+            "description": "Summarize a large input file in one pass without returning its contents: line count, "
+            "line widths and grid dimensions, character histogram, delimiters, numeric ranges and head/tail samples, "
+            "for the whole file and for each blank-line separated section (runs of sections with the same shape "
+            "are listed once, with a count).",
+            "inputSchema": {
+                "json": {
+                    "type": "object",
+                    "properties": {
+                        "directory_path": {
+                            "type": "string",
+                            "description": "The path to the directory.",
+                        },
+                        "file_name": {"type": "string", "description": "The filename."},
+                        "sample_lines": {
+                            "type": "integer",
+                            "description": "Number of lines to include from the start and end of the file and of each section (at most 50).",
+                            "default": 3,
+                        },
+                    },
+                    "required": ["directory_path", "file_name"],
+                }
+            },
+        }
     }
 ]
 
@@ -86,11 +197,21 @@ filesystem_tools_prompt = """
 You are a {{ROLE}}. In addition to your core and most essential capabiltiies, you also have access to a 
 file system assistant that provides file utilities from specified directories using the following tools:
 - File_Reading_Tool, which expects directory_path and optionally accepts recursive or file_pattern. 
+Set metadata_only to list files without loading their contents.
+Large files can be read in pieces with start_line/end_line or byte_offset/byte_length.  Each call returns
+ at most max_bytes of content; if next_cursor is present, pass it back as cursor to continue reading.
+Results list each file as a "==> path <== N bytes, sha256 ..." header followed by exactly N bytes of its raw
+ contents; a file whose contents repeat an earlier one is listed as "same content as" that path.  Set skip_unchanged
+ when re-reading a folder to leave out files you already have that have not changed.
 Assume that any file reads originate in the input folder {{ROLE_INPUT_FOLDER}} unless otherwise specified.
 - File_Writing_Tool, which expects directory_path, file_name, and file_content.  Assume that any working
  file writes should be written back to the intput folder {{ROLE_INPUT_FOLDER}} unless otherwise specified.
+To change part of an existing file, send edits (search/replace pairs) or a unified diff as patch instead of
+ file_content, along with base_sha256 from the last read of that file.
 - File_Copy_Tool, which expects source_file and destination_file.  This function is permitted to copy files
  from the input folder {{ROLE_INPUT_FOLDER}} to other locations within the "work" folder.
+- Input_Profile_Tool, which expects directory_path and file_name.  Use it to learn the shape of a puzzle input
+ (sections, grid size, delimiters, number ranges, samples) before deciding whether to read the whole file.
 
 If the user provides a directory, infer the approximate location relative to the "work" folder in the current
  working directory. You may also be responsible for loading the contents of those files
@@ -101,6 +222,7 @@ To use the tool, you strictly apply the provided tool specification.
 - Only use the File_Reading_Tool for retrieving data. Never guess or make up information.
 - Only use the File_Writing_Tool for storing data. Never guess or make up information.
 - Only use the File_Copy_Tool for duplicating files within the work directory.  Never guess or make up information.
+- Prefer the Input_Profile_Tool over reading a large input file in full when only its structure is needed.
 - If the tool errors, apologize and explain what went wrong
 - If asked for the raw contents of a file, reproduce them accurately with no summarization inside of a Markdown code block
 - Only use tools if clearly needed to support your task.  Many tasks can be completed without a tool.
@@ -108,67 +230,658 @@ To use the tool, you strictly apply the provided tool specification.
 """
 
 
+TOOL_WORKERS = 8
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="file-tool")
+
+
+class _PathLocks:
+    """
+    Per-path locks, used as `with _path_locks[path]:`.
+
+    A lock exists only while some thread holds or waits for it, so the map does not grow
+    with every path ever written.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, path):
+        return self._hold(path)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locks)
+
+    @contextlib.contextmanager
+    def _hold(self, path):
+        with self._lock:
+            entry = self._locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[path]
+
+
+_path_locks = _PathLocks()
+
+# Callables invoked with the absolute path of every file the tools write or copy
+write_listeners = []
+
+
+def _notify_write(file_path):
+    file_path = os.path.abspath(file_path)
+    directory_index.invalidate(os.path.dirname(file_path))
+    for listener in write_listeners:
+        listener(file_path)
+
+
 async def file_tools_handler(
-    response: ConversationMessage, conversation: List[Dict[str, Any]]
+    response: ConversationMessage, conversation: List[Dict[str, Any]], tool_functions=None,
+    history_policy=None,
 ) -> ConversationMessage:
+    """
+    Runs every tool-use block of a model turn concurrently on the tool thread pool.
+
+    Results are returned in the same order as the tool-use blocks.  A block waits for
+    every earlier block it conflicts with: writes and copies to the same path, and reads
+    of a file or folder that an earlier block writes into (or the reverse), run in the
+    order they were requested.  Tools with no known paths run after all earlier blocks.
+
+    :param tool_functions: Tool name to function mapping; defaults to the file tools
+    :param history_policy: The HistoryPolicy the agent's requests go through, so
+        skip_unchanged only skips files whose contents the model will still see
+    """
+    tool_functions = tool_functions or _tool_functions
     response_content_blocks = response.content
-    print(response_content_blocks)
-    tool_results = []
 
     if not response_content_blocks:
         raise ValueError("No content blocks in response")
 
+    pending = []
+    scheduled = []
+    seen = None
+
     for content_block in response_content_blocks:
         if "toolUse" in content_block:
             tool_use_block = content_block["toolUse"]
-            tool_use_name = tool_use_block.get("name")
-
-            if tool_use_name == "File_Reading_Tool":
-                tool_response = await read_files(tool_use_block["input"])
-                tool_results.append(
-                    {
-                        "toolResult": {
-                            "toolUseId": tool_use_block["toolUseId"],
-                            "content": [{"json": {"result": tool_response}}],
-                        }
-                    }
-                )
-            elif tool_use_name == "File_Writing_Tool":
-                tool_response = await write_file(tool_use_block["input"])
-                tool_results.append(
-                    {
-                        "toolResult": {
-                            "toolUseId": tool_use_block["toolUseId"],
-                            "content": [{"json": {"result": tool_response}}],
-                        }
-                    }
-                )
-            elif tool_use_name == "File_Copy_Tool":
-                tool_response = await copy_file(tool_use_block["input"])
-                tool_results.append(
-                    {
-                        "toolResult": {
-                            "toolUseId": tool_use_block["toolUseId"],
-                            "content": [{"json": {"result": tool_response}}],
-                        }
-                    }
-                )
-    message = ConversationMessage(role=ParticipantRole.USER.value, content=tool_results)
+            tool = tool_functions.get(tool_use_block.get("name"))
+            if tool is None:
+                continue
+            if tool is read_files and (tool_use_block.get("input") or {}).get("skip_unchanged"):
+                if seen is None:
+                    seen = seen_files(conversation, history_policy)
+                tool = functools.partial(read_files, seen=seen)
+
+            paths = _tool_paths(tool_use_block)
+            depends_on = [
+                task for task, earlier in scheduled if _conflicts(paths, earlier)
+            ]
+            task = asyncio.ensure_future(_run_tool_use(tool, tool_use_block, depends_on))
+            scheduled.append((task, paths))
+            pending.append(task)
+
+    tool_results = await asyncio.gather(*pending)
+    message = ConversationMessage(role=ParticipantRole.USER.value, content=list(tool_results))
 
     return message
 
 
-async def read_files(input_data):
+def make_tools_handler(extra_tool_functions=None, history_policy=None):
+    """
+    Returns a tool handler for agents that get other tools alongside the file tools, or
+    whose requests are compacted by a HistoryPolicy.
+
+    :param extra_tool_functions: Tool name to function mapping added to the file tools
+    :param history_policy: HistoryPolicy applied to the agent's requests
+    """
+    tool_functions = {**_tool_functions, **(extra_tool_functions or {})}
+
+    async def tools_handler(response, conversation):
+        return await file_tools_handler(response, conversation, tool_functions, history_policy)
+
+    return tools_handler
+
+
+async def _run_tool_use(tool, tool_use_block, depends_on):
+    """
+    Runs a single tool-use block once the earlier blocks it conflicts with are done.
+    """
+    if depends_on:
+        await asyncio.wait(depends_on)
+    start = time.perf_counter()
+    tool_response = await tool(tool_use_block["input"])
+    # Compact text results go out as they are, without another layer of JSON escaping
+    if isinstance(tool_response, str):
+        content = [{"text": tool_response}]
+    else:
+        content = [{"json": {"result": tool_response}}]
+    if recorder.enabled:
+        recorder.record(
+            "tool", tool_use_block["name"], time.perf_counter() - start,
+            bytes_in=len(json.dumps(tool_use_block["input"])),
+            bytes_out=len(json.dumps(content)),
+        )
+    return {
+        "toolResult": {
+            "toolUseId": tool_use_block["toolUseId"],
+            "content": content,
+        }
+    }
+
+
+def _tool_paths(tool_use_block):
+    """
+    Returns (reads, writes) tuples of absolute paths a tool-use block touches, or None
+    for tools whose paths are unknown.
+    """
+    input_data = tool_use_block.get("input") or {}
+    name = tool_use_block.get("name")
+    target = _write_target(tool_use_block)
+    if name == "File_Reading_Tool":
+        reads = [input_data.get("directory_path")]
+    elif name == "Input_Profile_Tool":
+        reads = [os.path.join(input_data.get("directory_path") or "", input_data.get("file_name") or "")]
+    elif name == "File_Copy_Tool":
+        reads = [input_data.get("file_source")]
+    elif name == "File_Writing_Tool":
+        reads = []
+    else:
+        return None
+    reads = tuple(os.path.abspath(path) for path in reads if path)
+    return reads, (target,) if target else ()
+
+
+def _conflicts(paths, earlier):
+    """
+    True if a block touching `paths` must wait for an earlier block touching `earlier`.
+    """
+    if paths is None or earlier is None:
+        return True
+    reads, writes = paths
+    earlier_reads, earlier_writes = earlier
+    return (
+        any(_overlaps(a, b) for a in writes for b in earlier_reads + earlier_writes)
+        or any(_overlaps(a, b) for a in reads for b in earlier_writes)
+    )
+
+
+def _overlaps(a, b):
+    """
+    True if one path is the other or lies inside it.
+    """
+    return a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+
+def _write_target(tool_use_block):
+    """
+    Returns the absolute path a write or copy tool-use block will modify, if any.
+    """
+    input_data = tool_use_block.get("input") or {}
+    if tool_use_block.get("name") == "File_Writing_Tool":
+        if input_data.get("directory_path") and input_data.get("file_name"):
+            return os.path.abspath(
+                os.path.join(input_data["directory_path"], input_data["file_name"])
+            )
+    elif tool_use_block.get("name") == "File_Copy_Tool":
+        file_dest = input_data.get("file_dest")
+        if file_dest:
+            if os.path.isdir(file_dest) and input_data.get("file_source"):
+                file_dest = os.path.join(file_dest, os.path.basename(input_data["file_source"]))
+            return os.path.abspath(file_dest)
+    return None
+
+
+async def _offload(func, input_data):
+    """
+    Runs a blocking tool implementation on the tool thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_tool_executor, func, input_data)
+
+
+DEFAULT_READ_BUDGET = 128 * 1024
+
+
+class FileContentCache:
+    """
+    Process-wide LRU cache of raw file bytes shared by every agent using these tools.
+
+    Entries are keyed on the absolute path and validated against the file's size and
+    mtime on every lookup, so edits made outside the tools are picked up as well.
+    The cache is bounded by the total number of bytes held.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entry_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path, stat):
+        """
+        Returns the cached bytes for file_path if they match the given os.stat result.
+        """
+        key = os.path.abspath(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != (stat.st_size, stat.st_mtime_ns):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, file_path, stat, content):
+        """
+        Stores content for file_path, evicting least recently used entries as needed.
+        """
+        if len(content) > self.max_entry_bytes:
+            return
+        key = os.path.abspath(file_path)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = ((stat.st_size, stat.st_mtime_ns), content)
+            self.total_bytes += len(content)
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def invalidate(self, file_path):
+        """
+        Drops any cached content for file_path.
+        """
+        with self._lock:
+            self._discard(os.path.abspath(file_path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """
+        Returns hit/miss counters and current occupancy.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+
+file_cache = FileContentCache()
+
+
+class DirectoryIndex:
+    """
+    Process-wide index of directory listings used to resolve File_Reading_Tool requests.
+
+    Each directory's listing is cached alongside the directory's mtime and only re-scanned
+    when that mtime changes, so repeated listings of an unchanged tree cost one stat per
+    directory and never open a file.  The tools invalidate a directory when they write,
+    copy or remove a file in it, and a listing taken within one mtime tick of the
+    directory's last change is not trusted, since a file created in the same tick would
+    leave the mtime unchanged.
+    """
+
+    # Coarsest common mtime resolution (FAT); ext4 and friends are far finer
+    mtime_tick_ns = 2_000_000_000
+
+    def __init__(self):
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def list_files(self, directory_path, recursive=True, file_pattern="*"):
+        """
+        Returns the sorted paths of files under directory_path matching a glob pattern.
+
+        :param directory_path: Directory to list; returned paths are joined onto it as given
+        :param recursive: Whether to descend into subdirectories
+        :param file_pattern: Glob matched against the file name, or against the path
+            relative to directory_path when it contains a '/'
+        :return: List of file paths
+        """
+        match_relative = "/" in file_pattern
+        file_paths = []
+        pending = [""]
+
+        while pending:
+            relative_dir = pending.pop()
+            try:
+                files, subdirs = self._listing(os.path.join(directory_path, relative_dir))
+            except OSError:
+                continue
+
+            for file in files:
+                relative_path = os.path.join(relative_dir, file)
+                if fnmatch.fnmatchcase(relative_path if match_relative else file, file_pattern):
+                    file_paths.append(os.path.join(directory_path, relative_path))
+
+            if recursive:
+                pending.extend(os.path.join(relative_dir, subdir) for subdir in subdirs)
+
+        return sorted(file_paths)
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+
+    def invalidate(self, directory):
+        """
+        Drops the cached listings of a directory and its ancestors, which may have gained
+        a subdirectory.
+        """
+        key = os.path.abspath(directory)
+        with self._lock:
+            while True:
+                self._dirs.pop(key, None)
+                parent = os.path.dirname(key)
+                if parent == key:
+                    break
+                key = parent
+
+    def _listing(self, directory):
+        """
+        Returns (files, subdirectories) for a directory, re-scanning only if it changed.
+        """
+        key = os.path.abspath(directory)
+        mtime = os.stat(key).st_mtime_ns
+
+        with self._lock:
+            cached = self._dirs.get(key)
+        if cached is not None and cached[0] == mtime and mtime < cached[3] - self.mtime_tick_ns:
+            return cached[1], cached[2]
+
+        scanned_at = time.time_ns()
+        files, subdirs = [], []
+        with os.scandir(key) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+
+        with self._lock:
+            self._dirs[key] = (mtime, files, subdirs, scanned_at)
+        return files, subdirs
+
+
+directory_index = DirectoryIndex()
+
+
+def _encode_cursor(file_path, offset):
+    """
+    Builds an opaque continuation cursor pointing at a byte offset within a file.
+    """
+    raw = json.dumps({"path": file_path, "offset": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    """
+    Reverses _encode_cursor, returning a (file_path, offset) tuple.
+    """
+    raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return raw["path"], int(raw["offset"])
+
+
+def _line_offset(mm, line_number):
+    """
+    Returns the byte offset at which the given 1-based line starts, or the end
+    of the buffer if the file has fewer lines.
+    """
+    pos = 0
+    for _ in range(line_number - 1):
+        pos = mm.find(b"\n", pos)
+        if pos == -1:
+            return len(mm)
+        pos += 1
+    return pos
+
+
+def _utf8_boundary(mm, pos):
+    """
+    Moves pos backwards so that it does not split a multi-byte UTF-8 character.
+    """
+    while 0 < pos < len(mm) and (mm[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def _slice_buffer(buf, read_range, offset, budget):
+    """
+    Selects the requested window of a bytes-like buffer (bytes or mmap).
+
+    :param buf: Buffer holding the whole file
+    :param read_range: Dictionary with optional start_line/end_line or byte_offset/byte_length
+    :param offset: Byte offset to resume from (from a cursor), or None
+    :param budget: Maximum number of bytes to return
+    :return: Tuple of (content, start, end, range_end) where end is the first unread
+        byte and range_end is where the requested window stops
+    """
+    size = len(buf)
+    if read_range.get("start_line") or read_range.get("end_line"):
+        lo = _line_offset(buf, read_range.get("start_line") or 1)
+        hi = size
+        if read_range.get("end_line"):
+            hi = _line_offset(buf, read_range["end_line"] + 1)
+    else:
+        lo = min(read_range.get("byte_offset") or 0, size)
+        hi = size
+        if read_range.get("byte_length") is not None:
+            hi = min(lo + read_range["byte_length"], size)
+
+    if offset is not None:
+        lo = max(lo, offset)
+
+    range_end = hi
+    if hi - lo > budget:
+        # Prefer to stop on a line boundary so the model never sees half a line
+        cut = buf.rfind(b"\n", lo, lo + budget)
+        hi = cut + 1 if cut != -1 else _utf8_boundary(buf, lo + budget)
+
+    lo = _utf8_boundary(buf, lo)
+    return buf[lo:hi].decode("utf-8"), lo, hi, range_end
+
+
+def _read_range(file_path, read_range, offset, budget):
+    """
+    Reads a slice of a file, serving it from file_cache when possible.  Files too
+    large to cache are sliced through mmap so only the requested window is copied.
+
+    :return: Tuple of (content, start, end, range_end, size, modified)
+    """
+    stat = os.stat(file_path)
+    if stat.st_size == 0:
+        return "", 0, 0, 0, 0, stat.st_mtime
+
+    buf = file_cache.get(file_path, stat)
+    if buf is None and stat.st_size <= file_cache.max_entry_bytes:
+        with open(file_path, "rb") as f:
+            buf = f.read()
+        file_cache.put(file_path, stat, buf)
+
+    if buf is not None:
+        window = _slice_buffer(buf, read_range, offset, budget)
+    else:
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            window = _slice_buffer(mm, read_range, offset, budget)
+
+    return (*window, stat.st_size, stat.st_mtime)
+
+
+# Compact read_files results: each file is a "==> path <== info" header line.  When info
+# starts with "N bytes", the next N bytes (UTF-8) are the file's raw content, followed by
+# a newline.  Other headers (errors, duplicates, unchanged files, listings) have no body.
+_FILE_HEADER = re.compile(r"^==> (?P<path>.+?) <== (?P<info>.*)$")
+_BODY_LENGTH = re.compile(r"^(\d+) bytes\b")
+# Whole-file headers the reader has the contents for: read, same content as, unchanged
+_WHOLE_FILE = re.compile(
+    r"^(?:\d+ bytes|same content as .+ \(\d+ bytes|unchanged since last read \(size \d+), "
+    r"sha256 (?P<sha256>[0-9a-f]{64})(?:$|[);])"
+)
+
+
+def encode_file_blocks(blocks, trailer=()):
+    """
+    Builds a compact read_files result.
+
+    :param blocks: (path, info, body) tuples; body is None for header-only entries,
+        otherwise info must start with the body's length as "N bytes"
+    :param trailer: Lines appended after the last file (e.g. next_cursor)
+    """
+    parts = []
+    for path, info, body in blocks:
+        parts.append(f"==> {path} <== {info}\n")
+        if body is not None:
+            parts.append(f"{body}\n")
+    parts.extend(f"{line}\n" for line in trailer)
+    return "".join(parts)
+
+
+def decode_file_blocks(text):
+    """
+    Reverses encode_file_blocks.
+
+    :return: Tuple of ((path, info, body) list, trailer line list)
+    """
+    data = text.encode("utf-8")
+    blocks, trailer = [], []
+    pos = 0
+    while pos < len(data):
+        end = data.find(b"\n", pos)
+        if end == -1:
+            end = len(data)
+        line = data[pos:end].decode("utf-8")
+        pos = end + 1
+        header = _FILE_HEADER.match(line)
+        if not header:
+            trailer.append(line)
+            continue
+        body = None
+        length = _BODY_LENGTH.match(header.group("info"))
+        if length:
+            body = data[pos:pos + int(length.group(1))].decode("utf-8", errors="replace")
+            pos += int(length.group(1)) + 1
+        blocks.append((header.group("path"), header.group("info"), body))
+    return blocks, trailer
+
+
+def seen_files(conversation, history_policy=None):
+    """
+    Paths and sha256 hashes of the whole files already returned by compact read_files
+    results in a conversation.
+
+    :param history_policy: Optional HistoryPolicy the agent's requests go through.  The
+        conversation is compacted as the next request will be (with the results being
+        prepared as its newest tool round), so files whose bodies the model will only
+        see as "omitted from history" do not count as seen.
+    """
+    messages = [
+        {"role": message.role, "content": message.content} if hasattr(message, "content") else message
+        for message in conversation
+    ]
+    if history_policy is not None:
+        upcoming = {"role": ParticipantRole.USER.value, "content": [{"toolResult": {"content": []}}]}
+        messages = history_policy.apply([*messages, upcoming])
+    seen = {}
+    for message in messages:
+        for block in message.get("content") or []:
+            for item in block.get("toolResult", {}).get("content", []):
+                if not item.get("text", "").startswith("==> "):
+                    continue
+                for path, info, body in decode_file_blocks(item["text"])[0]:
+                    whole = _WHOLE_FILE.match(info)
+                    # "same content as" and "unchanged" entries only count while the
+                    # body they point back to is still visible
+                    if whole and (body is not None or whole.group("sha256") in seen.values()):
+                        seen[path] = whole.group("sha256")
+    return seen
+
+
+def _compact_file_data(file_data):
+    """
+    Renders read_files' per-file dictionaries as (path, info, body) blocks.
+    """
+    blocks = []
+    for file_path, entry in file_data.items():
+        if "error" in entry:
+            blocks.append((file_path, f"error: {entry['error']}", None))
+        elif entry.get("unchanged"):
+            blocks.append((file_path, f"unchanged since last read (size {entry['size']}, "
+                                      f"sha256 {entry['sha256']}); omit skip_unchanged to read it again", None))
+        elif "content" not in entry:
+            modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry["modified"]))
+            blocks.append((file_path, f"size {entry['size']}, modified {modified}", None))
+        else:
+            # The body length comes from the body itself: the file may have changed size
+            # between the stat and the read, and a wrong length breaks every later block
+            length = len(entry["content"].encode("utf-8"))
+            if "range" in entry:
+                lo, hi = entry["range"]["start"], entry["range"]["end"]
+                info = f"{length} bytes, range {lo}-{hi} of {entry['size']}"
+            else:
+                info = f"{length} bytes, sha256 {entry['sha256']}"
+            if entry.get("truncated"):
+                info += ", truncated"
+            if "same_as" in entry:
+                blocks.append((file_path, f"same content as {entry['same_as']} ({info})", None))
+            else:
+                blocks.append((file_path, info, entry["content"]))
+    return blocks
+
+
+async def read_files(input_data, seen=None):
     """
     Reads files in the specified directory and returns their contents.
 
+    Files are read in sorted path order.  Optional line or byte ranges are applied
+    to every matched file, and the combined content is capped at max_bytes.  When
+    the budget runs out, the result includes a next_cursor to resume from.
+
+    By default the result is compact text (see encode_file_blocks): raw contents under
+    a header per file, with repeated contents sent once and referenced by path after
+    that.  format "json" returns the per-file dictionaries as a file_data JSON string.
+
     :param input_data: Dictionary containing directory_path and optional parameters
-    :return: Dictionary containing file listings and their contents
+    :param seen: Path to sha256 mapping of files the session already has (see
+        seen_files); with skip_unchanged, their contents are omitted if unchanged
+    :return: Compact text, or a dictionary with file_data or an error
     """
+    return await _offload(functools.partial(_read_files, seen=seen), input_data)
+
+
+def _read_files(input_data, seen=None):
     try:
         directory_path = input_data.get("directory_path")
         recursive = input_data.get("recursive", True)
-        file_pattern = input_data.get("file_pattern", "*")
+        file_pattern = input_data.get("file_pattern") or "*"
+        metadata_only = input_data.get("metadata_only", False)
+        max_bytes = input_data.get("max_bytes") or DEFAULT_READ_BUDGET
+        cursor = input_data.get("cursor")
+        output_format = input_data.get("format") or "text"
+        skip_unchanged = input_data.get("skip_unchanged", False) and seen
+        read_range = {
+            key: input_data.get(key)
+            for key in ("start_line", "end_line", "byte_offset", "byte_length")
+        }
 
         if not os.path.exists(directory_path):
             return {"error": "Directory not found"}
@@ -176,44 +889,100 @@ async def read_files(input_data):
         if not os.path.isdir(directory_path):
             return {"error": "Path is not a directory"}
 
+        if output_format not in ("text", "json"):
+            return {"error": "format must be text or json"}
+
+        if (read_range["start_line"] or read_range["end_line"]) and (
+            read_range["byte_offset"] is not None or read_range["byte_length"] is not None
+        ):
+            return {"error": "Use either a line range or a byte range, not both"}
+
+        file_paths = directory_index.list_files(directory_path, recursive, file_pattern)
+
+        if metadata_only:
+            file_data = {}
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                    file_data[file_path] = {"size": stat.st_size, "modified": stat.st_mtime}
+                except OSError as e:
+                    file_data[file_path] = {"error": f"Could not stat file: {str(e)}"}
+            if output_format == "json":
+                return {"file_data": json.dumps(file_data)}
+            return encode_file_blocks(_compact_file_data(file_data)) or "No matching files"
+
+        resume_path, resume_offset = None, None
+        if cursor:
+            try:
+                resume_path, resume_offset = _decode_cursor(cursor)
+            except Exception:
+                return {"error": "Invalid cursor"}
+
+        whole_files = not any(value is not None for value in read_range.values())
         file_data = {}
+        first_path = {}
+        next_cursor = None
+        remaining = max_bytes
 
-        if recursive:
-            for root, _, files in os.walk(directory_path):
-                for file in files:
-                    if file_pattern == "*" or file.endswith(
-                        file_pattern.replace("*", "")
-                    ):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                file_data[file_path] = {
-                                    "content": f.read(),
-                                    "size": os.path.getsize(file_path),
-                                    "modified": os.path.getmtime(file_path),
-                                }
-                        except Exception as e:
-                            file_data[file_path] = {
-                                "error": f"Could not read file: {str(e)}"
-                            }
-        else:
-            for file in os.listdir(directory_path):
-                if file_pattern == "*" or file.endswith(file_pattern.replace("*", "")):
-                    file_path = os.path.join(directory_path, file)
-                    if os.path.isfile(file_path):
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                file_data[file_path] = {
-                                    "content": f.read(),
-                                    "size": os.path.getsize(file_path),
-                                    "modified": os.path.getmtime(file_path),
-                                }
-                        except Exception as e:
-                            file_data[file_path] = {
-                                "error": f"Could not read file: {str(e)}"
-                            }
-
-        return {"file_data": json.dumps(file_data)}
+        for file_path in file_paths:
+            if resume_path is not None and file_path < resume_path:
+                continue
+            offset = resume_offset if file_path == resume_path else None
+
+            if remaining <= 0:
+                next_cursor = _encode_cursor(file_path, offset or 0)
+                break
+
+            try:
+                if skip_unchanged and whole_files and offset is None and file_path in seen:
+                    digest = _file_sha256(file_path)
+                    if digest == seen[file_path]:
+                        stat = os.stat(file_path)
+                        file_data[file_path] = {
+                            "size": stat.st_size,
+                            "modified": stat.st_mtime,
+                            "sha256": digest,
+                            "unchanged": True,
+                        }
+                        continue
+
+                content, lo, hi, range_end, size, modified = _read_range(
+                    file_path, read_range, offset, remaining
+                )
+                file_data[file_path] = {
+                    "content": content,
+                    "size": size,
+                    "modified": modified,
+                }
+                digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                if lo > 0 or hi < size:
+                    file_data[file_path]["range"] = {"start": lo, "end": hi}
+                else:
+                    file_data[file_path]["sha256"] = digest
+
+                # Identical contents (e.g. input.txt in both day folders) are sent once
+                original = first_path.setdefault(digest, file_path)
+                if original != file_path and output_format == "text":
+                    file_data[file_path]["same_as"] = original
+                else:
+                    remaining -= hi - lo
+
+                if hi < range_end:
+                    file_data[file_path]["truncated"] = True
+                    next_cursor = _encode_cursor(file_path, hi)
+                    break
+            except Exception as e:
+                file_data[file_path] = {
+                    "error": f"Could not read file: {str(e)}"
+                }
+
+        if output_format == "json":
+            result = {"file_data": json.dumps(file_data)}
+            if next_cursor:
+                result["next_cursor"] = next_cursor
+            return result
+        trailer = [f"next_cursor: {next_cursor}"] if next_cursor else []
+        return encode_file_blocks(_compact_file_data(file_data), trailer) or "No matching files"
 
     except Exception as e:
         return {"error": type(e).__name__, "message": str(e)}
@@ -226,10 +995,17 @@ async def write_file(input_data):
     :param input_data: Dictionary containing directory_path, file_name, and file_content
     :return: Dictionary containing status of write operations
     """
+    return await _offload(_write_file, input_data)
+
+
+def _write_file(input_data):
     try:
         directory_path = input_data.get("directory_path")
         file_name = input_data.get("file_name")
         file_content = input_data.get("file_content")
+        edits = input_data.get("edits")
+        patch = input_data.get("patch")
+        base_sha256 = input_data.get("base_sha256")
 
         if not directory_path:
             return {"error": "Directory path not provided"}
@@ -237,9 +1013,13 @@ async def write_file(input_data):
         if not file_name:
             return {"error": "No file provided to write"}
 
-        if not file_content:
+        modes = [mode for mode in (file_content, edits, patch) if mode]
+        if not modes:
             return {"error": "No content provided to write"}
 
+        if len(modes) > 1:
+            return {"error": "Provide only one of file_content, edits or patch"}
+
         if not os.path.exists(directory_path):
             return {"error": "directory_path invalid"}
     
@@ -248,14 +1028,34 @@ async def write_file(input_data):
         file_path = os.path.join(directory_path, file_name)
 
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(file_content)
+            with _path_locks[os.path.abspath(file_path)]:
+                current = None
+                if os.path.exists(file_path):
+                    with open(file_path, "r", encoding="utf-8", newline="") as f:
+                        current = f.read()
 
-            result_data[file_path] = {
-                "status": "success",
-                "size": os.path.getsize(file_path),
-                "modified": os.path.getmtime(file_path),
-            }
+                if base_sha256 and base_sha256 != _sha256(current or ""):
+                    return {"error": "Stale base: the file has changed since it was read"}
+
+                if edits:
+                    if current is None:
+                        return {"error": "Cannot apply edits to a file that does not exist"}
+                    file_content = _apply_edits(current, edits)
+                elif patch:
+                    file_content = _apply_unified_diff(current or "", patch)
+
+                _atomic_write(file_path, file_content)
+                file_cache.invalidate(file_path)
+                _notify_write(file_path)
+
+                result_data[file_path] = {
+                    "status": "success",
+                    "size": os.path.getsize(file_path),
+                    "modified": os.path.getmtime(file_path),
+                    "sha256": _sha256(file_content),
+                }
+        except PatchError as e:
+            return {"error": "PatchError", "message": str(e)}
         except Exception as e:
             result_data[file_path] = {"error": f"Could not write file: {str(e)}"}
 
@@ -264,6 +1064,159 @@ async def write_file(input_data):
     except Exception as e:
         return {"error": type(e).__name__, "message": str(e)}
 
+
+class PatchError(ValueError):
+    """
+    Raised when edits or a unified diff do not apply cleanly to the current file.
+    """
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(file_path, content):
+    """
+    Writes content to a temporary file next to file_path and renames it into place,
+    so readers never observe a partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    mode = os.stat(file_path).st_mode & 0o777 if os.path.exists(file_path) else 0o644
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _apply_edits(content, edits):
+    """
+    Applies search/replace edits in order.  Every search string must occur exactly once.
+    """
+    for index, edit in enumerate(edits):
+        search = edit.get("search")
+        replace = edit.get("replace", "")
+        if not search:
+            raise PatchError(f"Edit {index} has an empty search string")
+        count = content.count(search)
+        if count != 1:
+            raise PatchError(f"Edit {index} search string matched {count} times, expected 1")
+        content = content.replace(search, replace, 1)
+    return content
+
+
+def _parse_hunks(patch):
+    """
+    Splits a unified diff into hunks of (old_start, old_lines, new_lines).
+
+    Line counts in the hunk headers are ignored in favour of the lines actually present,
+    since hand-written diffs frequently get them wrong.
+    """
+    hunks = []
+    current = None
+    last_tag = None
+
+    for line in patch.splitlines(keepends=True):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None:
+            # File headers (---/+++, diff --git, index ...) before the first hunk
+            continue
+
+        _, old_lines, new_lines = current
+        if line.startswith("\\"):
+            # "\ No newline at end of file" applies to the previous line
+            targets = {" ": (old_lines, new_lines), "-": (old_lines,), "+": (new_lines,)}
+            for lines in targets.get(last_tag, ()):
+                if lines and lines[-1].endswith("\n"):
+                    lines[-1] = lines[-1][:-1]
+            continue
+
+        tag, text = (line[0], line[1:]) if line.strip("\r\n") else (" ", line)
+        if not text.endswith("\n"):
+            text += "\n"
+        if tag == " ":
+            old_lines.append(text)
+            new_lines.append(text)
+        elif tag == "-":
+            old_lines.append(text)
+        elif tag == "+":
+            new_lines.append(text)
+        else:
+            raise PatchError(f"Unexpected line in hunk: {line!r}")
+        last_tag = tag
+
+    if not hunks:
+        raise PatchError("Patch does not contain any hunks")
+    return hunks
+
+
+def _find_hunk(lines, old_lines, expected, start):
+    """
+    Finds where old_lines occur in lines at or after start, preferring the position
+    closest to the one named in the hunk header.
+    """
+    def matches(at):
+        return all(
+            lines[at + i].rstrip("\r\n") == old.rstrip("\r\n")
+            for i, old in enumerate(old_lines)
+        )
+
+    last = len(lines) - len(old_lines)
+    expected = min(max(expected, start), max(last, start))
+    for distance in range(0, max(last - start, 0) + 1):
+        for at in (expected - distance, expected + distance):
+            if start <= at <= last and matches(at):
+                return at
+    return None
+
+
+def _apply_unified_diff(content, patch):
+    """
+    Applies a unified diff to content, matching each hunk's context exactly but
+    tolerating shifted line numbers.
+    """
+    lines = content.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        trailing_newline = False
+        lines[-1] += "\n"
+    else:
+        trailing_newline = True
+
+    result = []
+    position = 0
+    for index, (old_start, old_lines, new_lines) in enumerate(_parse_hunks(patch)):
+        expected = old_start - 1 if old_lines else old_start
+        at = _find_hunk(lines, old_lines, expected, position) if old_lines else max(expected, position)
+        if at is None or at > len(lines):
+            raise PatchError(f"Hunk {index} does not apply to the current file")
+        result.extend(lines[position:at])
+        result.extend(new_lines)
+        position = at + len(old_lines)
+    result.extend(lines[position:])
+
+    patched = "".join(result)
+    if not trailing_newline and position < len(lines):
+        # The untouched tail still ends with the newline added above
+        patched = patched[:-1]
+    return patched
+
+
 async def copy_file(input_data):
     """
     Copies a file from the specified source to the specified destination.
@@ -271,6 +1224,10 @@ async def copy_file(input_data):
     :param input_data: Dictionary containing file_source and file_dest
     :return: Dictionary containing status of write operations
     """
+    return await _offload(_copy_file, input_data)
+
+
+def _copy_file(input_data):
     try:
         file_source = input_data.get("file_source")
         file_dest = input_data.get("file_dest")
@@ -285,24 +1242,436 @@ async def copy_file(input_data):
             if not os.path.exists(file_source):
                 return {"error": "file_source does not exist"}
             
-            if os.path.exists(file_dest):
-                os.remove(file_dest)        
-                
             result_data = {}
-            
-            # Copy the file
-            shutil.copy(file_source, file_dest)
 
-            result_data[file_dest] = {
-                "status": "success",
-                "size": os.path.getsize(file_dest),
-                "modified": os.path.getmtime(file_dest),
-            }
+            if os.path.isdir(file_dest):
+                file_dest = os.path.join(file_dest, os.path.basename(file_source))
+
+            with _path_locks[os.path.abspath(file_dest)]:
+                status = "unchanged"
+                if not _same_content(file_source, file_dest):
+                    fast_copy(file_source, file_dest)
+                    file_cache.invalidate(file_dest)
+                    _notify_write(file_dest)
+                    status = "success"
+
+                result_data[file_dest] = {
+                    "status": status,
+                    "size": os.path.getsize(file_dest),
+                    "modified": os.path.getmtime(file_dest),
+                }
         except FileNotFoundError as e:
             result_data[file_dest] = {"error": f"Could not write source file: {str(e)}"}
-        print("!!!!!!!!!!!!!!!!! 5")    
-        print(result_data)
         return {"copy_results": json.dumps(result_data)}
 
     except Exception as e:
         return {"error": type(e).__name__, "message": str(e)}
+
+
+# Linux ioctl to share extents between files on copy-on-write filesystems (btrfs, xfs)
+_FICLONE = 0x40049409
+
+
+def _file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _same_content(source, dest):
+    """
+    Returns True if dest already exists with the same bytes as source.
+    """
+    try:
+        source_stat = os.stat(source)
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+    if (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+        return True
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    return _file_sha256(source) == _file_sha256(dest)
+
+
+def _clone_into(source_fd, dest_fd, size):
+    """
+    Copies size bytes between open files with the cheapest mechanism available:
+    a reflink, then an in-kernel copy_file_range, then a userspace copy.
+    """
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dest_fd, _FICLONE, source_fd)
+            return
+        except OSError:
+            pass
+
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                written = os.copy_file_range(source_fd, dest_fd, size - copied)
+                if written == 0:
+                    break
+                copied += written
+            if copied >= size:
+                return
+        except OSError:
+            pass
+
+    os.lseek(source_fd, copied, os.SEEK_SET)
+    os.lseek(dest_fd, copied, os.SEEK_SET)
+    while True:
+        chunk = os.read(source_fd, 1024 * 1024)
+        if not chunk:
+            break
+        os.write(dest_fd, chunk)
+
+
+def fast_copy(source, dest, link=False):
+    """
+    Copies source to dest through a temporary file and an atomic rename.
+
+    :param source: File to copy
+    :param dest: Destination file path
+    :param link: Hard link instead of copying when both paths are on the same
+        filesystem.  Only safe when neither file will be edited in place.
+    """
+    directory = os.path.dirname(os.path.abspath(dest))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(dest)}.", suffix=".tmp"
+    )
+    try:
+        if link:
+            os.close(fd)
+            fd = None
+            os.remove(temp_path)
+            try:
+                os.link(source, temp_path)
+            except OSError:
+                link = False
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+        if not link:
+            with open(source, "rb") as src:
+                _clone_into(src.fileno(), fd, os.fstat(src.fileno()).st_size)
+            os.close(fd)
+            fd = None
+            shutil.copymode(source, temp_path)
+
+        os.replace(temp_path, dest)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# Separators worth reporting, checked in this order; longer tokens first so "->" beats "-"
+_DELIMITER_CANDIDATES = (b" -> ", b"->", b": ", b", ", b",", b"|", b";", b":", b"\t", b" ", b"-")
+_INTEGER = re.compile(rb"(?<![0-9])-?[0-9]+")
+
+# Longer digit runs (e.g. a whole line of digits) are counted but not parsed: int() refuses
+# strings over 4300 digits, and their value says nothing about the input's shape anyway
+_MAX_NUMBER_DIGITS = 32
+
+# Section entries listed in a profile after runs of same-shaped sections are merged
+_MAX_SECTION_ENTRIES = 20
+
+DEFAULT_SAMPLE_LINES = 3
+MAX_SAMPLE_LINES = 50
+
+
+class _SectionProfile:
+    '''
+    Running statistics for one blank-line separated block of lines
+    '''
+
+    def __init__(self, start_line, sample_lines):
+        self.start_line = start_line
+        self.lines = 0
+        self.min_width = None
+        self.max_width = 0
+        self.head = []
+        self.tail = deque(maxlen=sample_lines)
+        self.sample_lines = sample_lines
+        self.delimiters = {candidate: None for candidate in _DELIMITER_CANDIDATES}
+        self.numbers = 0
+        self.numbers_per_line = None
+        self.min_number = None
+        self.max_number = None
+        self.long_numbers = 0
+        self.long_number_digits = 0
+        self.digit_only_lines = 0
+
+    def add(self, line):
+        width = len(line.decode("utf-8", errors="replace"))
+        self.lines += 1
+        self.min_width = width if self.min_width is None else min(self.min_width, width)
+        self.max_width = max(self.max_width, width)
+        if len(self.head) < self.sample_lines:
+            self.head.append(line)
+        self.tail.append(line)
+
+        # Track (min, max) occurrences per line; a candidate missing from any line is dropped
+        for candidate, counts in self.delimiters.items():
+            if counts is False:
+                continue
+            found = line.count(candidate)
+            if not found:
+                self.delimiters[candidate] = False
+            elif counts is None:
+                self.delimiters[candidate] = (found, found)
+            else:
+                self.delimiters[candidate] = (min(counts[0], found), max(counts[1], found))
+
+        tokens = _INTEGER.findall(line)
+        values = []
+        for token in tokens:
+            digits = len(token.lstrip(b"-"))
+            if digits > _MAX_NUMBER_DIGITS:
+                self.long_numbers += 1
+                self.long_number_digits = max(self.long_number_digits, digits)
+            else:
+                values.append(int(token))
+        if tokens and line.isdigit():
+            self.digit_only_lines += 1
+        self.numbers += len(tokens)
+        if values:
+            low, high = min(values), max(values)
+            self.min_number = low if self.min_number is None else min(self.min_number, low)
+            self.max_number = high if self.max_number is None else max(self.max_number, high)
+        counts = self.numbers_per_line
+        self.numbers_per_line = (
+            (len(tokens), len(tokens)) if counts is None
+            else (min(counts[0], len(tokens)), max(counts[1], len(tokens)))
+        )
+
+    def summary(self):
+        delimiters = {}
+        for candidate, counts in self.delimiters.items():
+            if not counts:
+                continue
+            # Skip separators that only occur as part of an already reported one
+            if any(candidate in reported.encode("utf-8") for reported in delimiters):
+                continue
+            delimiters[candidate.decode("utf-8")] = {"per_line_min": counts[0], "per_line_max": counts[1]}
+
+        result = {
+            "start_line": self.start_line,
+            "end_line": self.start_line + self.lines - 1,
+            "lines": self.lines,
+            "width": {"min": self.min_width, "max": self.max_width},
+            "delimiters": delimiters,
+        }
+        # Equal-width lines without spaces or several numbers per line read as a character grid
+        # (digit grids such as height maps parse as one number per line)
+        if (self.lines > 1 and self.min_width == self.max_width
+                and " " not in delimiters and (self.numbers_per_line or (0, 0))[1] <= 1):
+            result["grid"] = {"rows": self.lines, "cols": self.max_width}
+        elif self.numbers:
+            result["numbers"] = {
+                "count": self.numbers,
+                "min": self.min_number,
+                "max": self.max_number,
+                "per_line_min": self.numbers_per_line[0],
+                "per_line_max": self.numbers_per_line[1],
+            }
+            if self.long_numbers:
+                result["numbers"]["too_long_to_parse"] = {
+                    "count": self.long_numbers,
+                    "max_digits": self.long_number_digits,
+                    "digit_only_lines": self.digit_only_lines,
+                }
+        result["head"] = [_sample(line) for line in self.head]
+        if self.lines > self.sample_lines:
+            result["tail"] = [_sample(line) for line in self.tail]
+        return result
+
+
+def _section_shape(summary):
+    numbers = summary.get("numbers", {})
+    return (
+        summary["lines"],
+        tuple((name, tuple(counts.values())) for name, counts in summary["delimiters"].items()),
+        "grid" in summary,
+        (numbers.get("per_line_min"), numbers.get("per_line_max")),
+    )
+
+
+def _merge_sections(summaries, max_entries=_MAX_SECTION_ENTRIES):
+    """
+    Collapses runs of consecutive sections with the same shape (line count, delimiters,
+    numbers per line) into one entry: the first section's samples, a "sections" count and
+    widths and number ranges covering the whole run.  Entries past max_entries are only
+    counted, under "more_sections".
+    """
+    entries = []
+    previous_shape = None
+    for summary in summaries:
+        shape = _section_shape(summary)
+        if entries and shape == previous_shape:
+            entry = entries[-1]
+            entry["sections"] = entry.get("sections", 1) + 1
+            entry["end_line"] = summary["end_line"]
+            entry["lines"] += summary["lines"]
+            entry["width"] = {
+                "min": min(entry["width"]["min"], summary["width"]["min"]),
+                "max": max(entry["width"]["max"], summary["width"]["max"]),
+            }
+            if "numbers" in summary:
+                numbers = entry["numbers"]
+                numbers["count"] += summary["numbers"]["count"]
+                for key, pick in (("min", min), ("max", max)):
+                    values = [v for v in (numbers[key], summary["numbers"][key]) if v is not None]
+                    numbers[key] = pick(values) if values else None
+            continue
+        previous_shape = shape
+        entries.append(summary)
+
+    if len(entries) <= max_entries:
+        return entries, 0
+    return entries[:max_entries], sum(entry.get("sections", 1) for entry in entries[max_entries:])
+
+
+def _sample(line, max_chars=200):
+    text = line.decode("utf-8", errors="replace")
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+async def profile_input(input_data):
+    """
+    Summarizes a file's structure in a single streaming pass over its lines.
+
+    :param input_data: Dictionary containing directory_path, file_name and optional sample_lines
+    :return: Dictionary containing the profile as a JSON string
+    """
+    return await _offload(_profile_input, input_data)
+
+
+def _profile_input(input_data):
+    try:
+        directory_path = input_data.get("directory_path")
+        file_name = input_data.get("file_name")
+        try:
+            sample_lines = int(input_data.get("sample_lines", DEFAULT_SAMPLE_LINES))
+        except (TypeError, ValueError):
+            sample_lines = DEFAULT_SAMPLE_LINES
+        sample_lines = min(max(0, sample_lines), MAX_SAMPLE_LINES)
+
+        if not directory_path:
+            return {"error": "Directory path not provided"}
+
+        if not file_name:
+            return {"error": "No file provided to profile"}
+
+        file_path = os.path.join(directory_path, file_name)
+        if not os.path.isfile(file_path):
+            return {"error": "File not found"}
+
+        histogram = Counter()
+        sections = []
+        current = None
+        head = []
+        tail = deque(maxlen=sample_lines)
+        line_count = 0
+        blank_lines = 0
+
+        with open(file_path, "rb") as f:
+            for raw_line in f:
+                line = raw_line.rstrip(b"\r\n")
+                line_count += 1
+                histogram.update(line)
+                if len(head) < sample_lines:
+                    head.append(line)
+                tail.append(line)
+
+                if not line.strip():
+                    blank_lines += 1
+                    current = None
+                    continue
+                if current is None:
+                    current = _SectionProfile(line_count, sample_lines)
+                    sections.append(current)
+                current.add(line)
+
+        profile = {
+            "path": file_path,
+            "bytes": os.path.getsize(file_path),
+            "lines": line_count,
+            "blank_lines": blank_lines,
+            "characters": {
+                chr(byte) if byte < 128 else f"0x{byte:02x}": count
+                for byte, count in histogram.most_common(32)
+            },
+            "distinct_characters": len(histogram),
+            "head": [_sample(line) for line in head],
+            "tail": [_sample(line) for line in tail] if line_count > sample_lines else [],
+        }
+        profile["sections"], more_sections = _merge_sections(
+            [section.summary() for section in sections]
+        )
+        if more_sections:
+            profile["more_sections"] = more_sections
+        return {"profile": json.dumps(profile)}
+
+    except Exception as e:
+        return {"error": type(e).__name__, "message": str(e)}
+
+
+def stage_workspace(base_path, work_path, overrides=None, link=False, clean=False):
+    """
+    Mirrors a template folder (e.g. solved_work_base) into a working folder, copying
+    only files whose contents differ.
+
+    :param base_path: Template directory to copy from
+    :param work_path: Directory to populate; created if missing
+    :param overrides: Optional mapping of paths relative to work_path to the files that
+        should be placed there instead of the template's copy (e.g. the day's input)
+    :param link: Hard link files instead of copying them where possible
+    :param clean: Remove files in work_path that are not present in base_path or overrides
+    :return: Dictionary mapping each destination path to copied/unchanged/removed/extra
+    """
+    results = {}
+    sources = {
+        os.path.relpath(source, base_path): source
+        for source in directory_index.list_files(base_path, recursive=True)
+    }
+    sources.update({os.path.normpath(path): source for path, source in (overrides or {}).items()})
+
+    for relative_path, source in sorted(sources.items()):
+        dest = os.path.join(work_path, relative_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+        with _path_locks[os.path.abspath(dest)]:
+            if _same_content(source, dest):
+                results[dest] = "unchanged"
+            else:
+                fast_copy(source, dest, link=link)
+                file_cache.invalidate(dest)
+                _notify_write(dest)
+                results[dest] = "copied"
+
+    for existing in directory_index.list_files(work_path, recursive=True):
+        if os.path.relpath(existing, work_path) in sources:
+            continue
+        if clean:
+            os.remove(existing)
+            file_cache.invalidate(existing)
+            directory_index.invalidate(os.path.dirname(existing))
+            results[existing] = "removed"
+        else:
+            results[existing] = "extra"
+
+    return results
+
+
+_tool_functions = {
+    "File_Reading_Tool": read_files,
+    "File_Writing_Tool": write_file,
+    "File_Copy_Tool": copy_file,
+    "Input_Profile_Tool": profile_input,
+}
@@ -0,0 +1,235 @@
+'''
+Keeps the conversation sent to the model roughly flat in size across a long session
+
+Applied to every converse/converse_stream request an agent makes:
+1. Stale tool payloads (file contents in older read_files results, file_content/patch
+   in older write requests) are replaced with a path and sha256 reference.
+2. Whole turns are dropped from the front of the conversation until the estimated
+   token count fits the budget.
+3. Optionally, the dropped turns are summarized into the first remaining prompt.
+
+Only the request is rewritten; the chat storage keeps the full history.
+'''
+import copy
+import hashlib
+import json
+
+from .filesystem_tool import decode_file_blocks, encode_file_blocks
+
+# Rough characters-per-token ratio for English text and JSON
+CHARS_PER_TOKEN = 4
+
+# Tool inputs and results that hold whole file bodies
+PAYLOAD_FIELDS = ("file_content", "patch", "content")
+
+
+def estimate_tokens(messages):
+    """
+    Cheap token estimate for a list of Converse API message dictionaries.
+    """
+    return len(json.dumps(messages, default=str)) // CHARS_PER_TOKEN
+
+
+def outline_summary(messages, max_chars=160):
+    """
+    Local summarizer: the opening line of every dropped text block, without a model call.
+
+    :param messages: Dropped Converse API message dictionaries
+    :param max_chars: Characters kept from each block
+    """
+    lines = []
+    for message in messages:
+        for block in message.get("content", []):
+            text = block.get("text", "").strip()
+            if text:
+                first_line = text.splitlines()[0][:max_chars]
+                lines.append(f"- {message['role']}: {first_line}")
+    return "\n".join(lines)
+
+
+class HistoryPolicy:
+    '''
+    Compacts the messages of a Converse request to fit a token budget
+    '''
+
+    def __init__(self, max_tokens=24000, keep_tool_rounds=2, min_payload_chars=512,
+                 summarizer=None):
+        """
+        :param max_tokens: Estimated token budget for the request messages
+        :param keep_tool_rounds: Number of most recent tool rounds whose payloads are kept
+        :param min_payload_chars: Payloads shorter than this are never stubbed
+        :param summarizer: Optional callable taking the dropped messages and returning
+            a summary string (e.g. outline_summary); dropped turns are discarded when None
+        """
+        self.max_tokens = max_tokens
+        self.keep_tool_rounds = keep_tool_rounds
+        self.min_payload_chars = min_payload_chars
+        self.summarizer = summarizer
+
+    def apply(self, messages, reserved_tokens=0):
+        """
+        Returns a compacted copy of messages; the input list is not modified.
+
+        :param reserved_tokens: Part of max_tokens taken by content added to the request
+            after compaction (e.g. a context bundle)
+        """
+        budget = self.max_tokens - reserved_tokens
+        messages = self.stub_stale_payloads(messages)
+        if estimate_tokens(messages) <= budget:
+            return messages
+
+        starts = self._turn_starts(messages)
+        if len(starts) < 2:
+            return messages
+        # Drop the fewest turns that fit the budget, but always keep the current turn
+        cut = starts[-1]
+        for start in starts[1:]:
+            if estimate_tokens(messages[start:]) <= budget:
+                cut = start
+                break
+        dropped = messages[:cut]
+
+        kept = messages[cut:]
+        if self.summarizer is not None:
+            summary = self.summarizer(dropped)
+            if summary:
+                first = copy.deepcopy(kept[0])
+                first["content"].insert(0, {
+                    "text": f"Summary of the earlier conversation:\n{summary}\n\n",
+                })
+                kept = [first, *kept[1:]]
+        return kept
+
+    def stub_stale_payloads(self, messages):
+        """
+        Replaces file bodies in all but the last keep_tool_rounds tool rounds with references.
+        """
+        tool_rounds = [
+            index for index, message in enumerate(messages)
+            if any("toolResult" in block for block in message.get("content", []))
+        ]
+        if len(tool_rounds) <= self.keep_tool_rounds:
+            return messages
+        # A round is a toolUse message and the toolResult message that answers it
+        cutoff = tool_rounds[-self.keep_tool_rounds] - 1 if self.keep_tool_rounds else len(messages)
+
+        compacted = list(messages)
+        for index in range(cutoff):
+            message = messages[index]
+            blocks = message.get("content", [])
+            if not any("toolUse" in block or "toolResult" in block for block in blocks):
+                continue
+            compacted[index] = {**message, "content": [self._stub_block(block) for block in blocks]}
+        return compacted
+
+    def _stub_block(self, block):
+        if "toolUse" in block:
+            tool_use = block["toolUse"]
+            return {"toolUse": {**tool_use, "input": self._stub_fields(tool_use.get("input"))}}
+        if "toolResult" in block:
+            tool_result = block["toolResult"]
+            content = []
+            for item in tool_result.get("content", []):
+                if "json" in item:
+                    item = {"json": self._stub_fields(item["json"])}
+                elif item.get("text", "").startswith("==> ") and len(item["text"]) >= self.min_payload_chars:
+                    item = {"text": self._stub_file_blocks(item["text"])}
+                content.append(item)
+            return {"toolResult": {**tool_result, "content": content}}
+        return block
+
+    def _stub_fields(self, value, path=None):
+        """
+        Walks tool input/output, replacing large payload strings with a reference.
+
+        read_files returns its per-file data as a JSON string; it is decoded so each
+        file keeps its path, size and hash while losing its content.
+        """
+        if isinstance(value, dict):
+            stubbed = {}
+            for key, item in value.items():
+                if key == "file_data" and isinstance(item, str) and len(item) >= self.min_payload_chars:
+                    try:
+                        files = json.loads(item)
+                    except ValueError:
+                        stubbed[key] = self._reference(item, path)
+                        continue
+                    stubbed[key] = json.dumps({
+                        file_path: self._stub_fields(data, file_path)
+                        for file_path, data in files.items()
+                    })
+                elif key in PAYLOAD_FIELDS and isinstance(item, str) and len(item) >= self.min_payload_chars:
+                    stubbed[key] = self._reference(item, path or value.get("file_name"))
+                else:
+                    stubbed[key] = self._stub_fields(item, path)
+            return stubbed
+        if isinstance(value, list):
+            return [self._stub_fields(item, path) for item in value]
+        return value
+
+    def _stub_file_blocks(self, text):
+        """
+        Drops the bodies of a compact read_files result, keeping each file's header.
+        """
+        blocks, trailer = decode_file_blocks(text)
+        stubbed = []
+        for path, info, body in blocks:
+            if body is not None and len(body) >= self.min_payload_chars:
+                digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+                info, body = (f"{len(body)} characters omitted from history, sha256 {digest}; "
+                              f"read the file again if its content is needed"), None
+            stubbed.append((path, info, body))
+        return encode_file_blocks(stubbed, trailer)
+
+    @staticmethod
+    def _reference(payload, path):
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        where = f" of {path}" if path else ""
+        return (f"<{len(payload)} characters{where} omitted from history, sha256 {digest}; "
+                f"read the file again if its content is needed>")
+
+    @staticmethod
+    def _turn_starts(messages):
+        """
+        Indices of user messages that begin a turn (text, not tool results).
+
+        Dropping only whole turns keeps the conversation starting with a user prompt and
+        every toolResult next to the toolUse it answers.
+        """
+        return [
+            index for index, message in enumerate(messages)
+            if message.get("role") == "user"
+            and not any("toolResult" in block for block in message.get("content", []))
+        ]
+
+
+class HistoryPolicyClient:
+    '''
+    Wraps a bedrock-runtime client so every request's messages go through a HistoryPolicy
+    '''
+
+    def __init__(self, client, policy, reserved_tokens=None):
+        """
+        :param client: bedrock-runtime compatible client
+        :param policy: HistoryPolicy applied to the request messages
+        :param reserved_tokens: Optional callable returning the tokens the wrapped client
+            adds to each request, which are subtracted from the policy's budget
+        """
+        self._client = client
+        self._policy = policy
+        self._reserved_tokens = reserved_tokens
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def converse(self, **kwargs):
+        return self._client.converse(**self._compact(kwargs))
+
+    def converse_stream(self, **kwargs):
+        return self._client.converse_stream(**self._compact(kwargs))
+
+    def _compact(self, kwargs):
+        if "messages" in kwargs:
+            reserved = self._reserved_tokens() if self._reserved_tokens else 0
+            kwargs = {**kwargs, "messages": self._policy.apply(kwargs["messages"], reserved)}
+        return kwargs
@@ -0,0 +1,196 @@
+'''
+Lightweight latency and token instrumentation for agents, routing and file tools
+
+Disabled by default; every hook checks recorder.enabled first so the cost when off is a
+single attribute lookup.  Enable it with recorder.configure(...) or by setting
+PUZZLER_TRACE (JSONL trace file) and/or PUZZLER_METRICS (Prometheus text snapshot file)
+before startup.
+'''
+import json
+import os
+import sys
+import threading
+import time
+
+from collections import defaultdict
+
+
+class Recorder:
+    '''
+    Collects per-event trace records and running totals for a Prometheus text snapshot
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self._trace = None
+        self.metrics_path = None
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._counters = defaultdict(float)
+
+    def configure(self, trace_path=None, metrics_path=None, enabled=True):
+        """
+        :param trace_path: Optional JSONL file that receives one line per event
+        :param metrics_path: Optional file that write_snapshot() refreshes
+        :param enabled: Turn recording on or off
+        """
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+            if trace_path:
+                self._trace = open(trace_path, "a", encoding="utf-8", buffering=1)
+            self.metrics_path = metrics_path
+            self.enabled = enabled
+
+    def record(self, kind, name, seconds, **fields):
+        """
+        Records one timed event.
+
+        :param kind: Event family: "model" (agent model calls), "client" (bedrock calls,
+            with hedging), "tool", "route" (classifying a turn), "router" (fast-path
+            rules), "turn" (a whole orchestrator turn) or "prefetch" (context bundles)
+        :param name: Agent, operation, tool, rule or folder the event belongs to
+        :param seconds: Wall time of the event
+        :param fields: Extra numeric fields (tokens, bytes, ...) added to the totals,
+            or strings that are only written to the trace
+        """
+        if not self.enabled:
+            return
+
+        event = {"ts": time.time(), "kind": kind, "name": name, "seconds": round(seconds, 6)}
+        event.update(fields)
+        line = json.dumps(event)
+
+        with self._lock:
+            self._counters[(f"puzzler_{kind}_calls_total", name)] += 1
+            self._counters[(f"puzzler_{kind}_seconds_total", name)] += seconds
+            for field, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._counters[(f"puzzler_{kind}_{field}_total", name)] += value
+            if self._trace is not None:
+                self._trace.write(line + "\n")
+
+    def prometheus_text(self):
+        """
+        Returns the running totals in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+
+        lines = []
+        last_metric = None
+        for (metric, name), value in counters:
+            if metric != last_metric:
+                lines.append(f"# TYPE {metric} counter")
+                last_metric = metric
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric}{{name="{label}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self):
+        """
+        Rewrites metrics_path with the current Prometheus snapshot, if one is configured.
+        """
+        if not self.enabled or not self.metrics_path:
+            return
+        # Concurrent turns all refresh the same file; metrics must never fail a request
+        with self._snapshot_lock:
+            temp_path = f"{self.metrics_path}.tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus_text())
+                os.replace(temp_path, self.metrics_path)
+            except OSError as e:
+                print(f"Could not write metrics snapshot {self.metrics_path}: {e}", file=sys.stderr)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+recorder = Recorder()
+
+if os.environ.get("PUZZLER_TRACE") or os.environ.get("PUZZLER_METRICS"):
+    recorder.configure(os.environ.get("PUZZLER_TRACE"), os.environ.get("PUZZLER_METRICS"))
+
+
+class InstrumentedClient:
+    '''
+    Wraps a bedrock-runtime client to record latency and token usage per agent
+    '''
+
+    def __init__(self, client, name):
+        """
+        :param client: bedrock-runtime compatible client
+        :param name: Label for the calls made through this client (usually the agent name)
+        """
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def converse(self, **kwargs):
+        if not recorder.enabled:
+            return self._client.converse(**kwargs)
+
+        start = time.perf_counter()
+        response = self._client.converse(**kwargs)
+        usage = response.get("usage", {})
+        recorder.record(
+            "model", self._name, time.perf_counter() - start,
+            input_tokens=usage.get("inputTokens", 0),
+            output_tokens=usage.get("outputTokens", 0),
+        )
+        return response
+
+    def converse_stream(self, **kwargs):
+        if not recorder.enabled:
+            return self._client.converse_stream(**kwargs)
+
+        start = time.perf_counter()
+        response = self._client.converse_stream(**kwargs)
+        return {**response, "stream": self._timed_stream(response["stream"], start)}
+
+    def _timed_stream(self, stream, start):
+        first_token = None
+        usage = {}
+        for event in stream:
+            if first_token is None and "contentBlockDelta" in event:
+                first_token = time.perf_counter() - start
+            if "metadata" in event:
+                usage = event["metadata"].get("usage", {})
+            yield event
+        recorder.record(
+            "model", self._name, time.perf_counter() - start,
+            input_tokens=usage.get("inputTokens", 0),
+            output_tokens=usage.get("outputTokens", 0),
+            first_token_seconds=round(first_token or 0.0, 6),
+        )
+
+
+class InstrumentedClassifier:
+    '''
+    Wraps an orchestrator classifier to record how long routing a turn takes, whichever
+    classifier does it
+
+    Delegates everything else, so it does not need to subclass Classifier (and import
+    the orchestrator's classifiers) itself.
+    '''
+
+    def __init__(self, classifier):
+        self._classifier = classifier
+
+    def __getattr__(self, attr):
+        return getattr(self._classifier, attr)
+
+    async def classify(self, input_text, chat_history):
+        if not recorder.enabled:
+            return await self._classifier.classify(input_text, chat_history)
+
+        start = time.perf_counter()
+        result = await self._classifier.classify(input_text, chat_history)
+        agent = result.selected_agent
+        recorder.record("route", agent.name if agent else "none", time.perf_counter() - start)
+        return result
@@ -0,0 +1,353 @@
+'''
+Build-and-run tool for checking a TypeScript solution in node_runner without a cold rebuild
+
+The solution's index.ts (and input.txt) are copied into node_runner/src, compiled by a
+tsc --watch process that stays warm between calls (or tsc --incremental when watching is
+disabled), and run with node under a timeout and heap cap.
+'''
+import atexit
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+from .filesystem_tool import _offload, _path_locks, _same_content, fast_copy, file_cache
+
+NODE_RUNNER_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "node_runner")
+)
+
+# Set to False to compile with a one-shot tsc --incremental on every call instead
+WATCH_BUILDS = True
+
+# Longest stdout/stderr returned to the agent; the rest is cut from the middle
+MAX_OUTPUT_CHARS = 8192
+
+node_runner_tools_description = [
+    {
+        "toolSpec": {
+            "name": "Build_And_Run_Tool",
+            "description": "Compile a solution's index.ts in the node_runner project and run it with node. "
+            "Returns the compiler errors, or the program's stdout/stderr, exit status, wall time and peak memory.",
+            "inputSchema": {
+                "json": {
+                    "type": "object",
+                    "properties": {
+                        "solution_path": {
+                            "type": "string",
+                            "description": "The directory containing index.ts (and usually input.txt).",
+                        },
+                        "input_file": {
+                            "type": "string",
+                            "description": "Optional path of the puzzle input to run against; defaults to input.txt in solution_path.",
+                        },
+                        "timeout_seconds": {
+                            "type": "number",
+                            "description": "Wall time after which the program is killed.",
+                            "default": 60,
+                        },
+                        "memory_mb": {
+                            "type": "integer",
+                            "description": "Heap limit passed to node as --max-old-space-size.",
+                            "default": 4096,
+                        },
+                    },
+                    "required": ["solution_path"],
+                }
+            },
+        }
+    }
+]
+
+node_runner_tools_prompt = """
+- Build_And_Run_Tool, which expects solution_path (usually {{ROLE_INPUT_FOLDER}}).  Use it to compile and run
+ index.ts against input.txt after writing it.  Fix any compiler errors it reports before presenting an answer,
+ and treat a timed_out result as a sign the approach is too slow for the real input.
+"""
+
+# "src/index.ts(12,5): error TS2322: ..." with --pretty false
+_TSC_DIAGNOSTIC = re.compile(r"^\S.*\(\d+,\d+\): error TS\d+:")
+# Printed by tsc --watch at the end of every compilation
+_WATCH_DONE = re.compile(r"Found (\d+) errors?\. Watching for file changes\.")
+
+
+def find_tsc(project_path=NODE_RUNNER_PATH):
+    """
+    Returns the project's TypeScript compiler, falling back to one on the PATH.
+    """
+    local = os.path.join(project_path, "node_modules", ".bin", "tsc")
+    if os.path.exists(local):
+        return local
+    return shutil.which("tsc")
+
+
+class TscWatcher:
+    '''
+    Keeps a tsc --watch process running for a project and reports each finished compile
+    '''
+
+    def __init__(self, tsc, project_path):
+        """
+        :param tsc: Path to the TypeScript compiler
+        :param project_path: Directory holding tsconfig.json
+        """
+        self._condition = threading.Condition()
+        self._builds = 0
+        self._diagnostics = []
+        self._last = None
+        self._process = subprocess.Popen(
+            [tsc, "--watch", "--preserveWatchOutput", "--pretty", "false", "-p", project_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+        )
+        threading.Thread(target=self._read_output, name="tsc-watch", daemon=True).start()
+
+    @property
+    def alive(self):
+        return self._process.poll() is None
+
+    @property
+    def builds(self):
+        with self._condition:
+            return self._builds
+
+    def wait(self, after, timeout):
+        """
+        Waits for a compile that finishes after `after` builds.
+
+        :return: Tuple of (error count, diagnostic lines), or None on timeout or exit
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._builds > after or not self.alive, timeout)
+            return self._last if self._builds > after else None
+
+    def last(self):
+        with self._condition:
+            return self._last
+
+    def stop(self):
+        if self.alive:
+            self._process.terminate()
+
+    def _read_output(self):
+        for line in self._process.stdout:
+            line = line.rstrip()
+            done = _WATCH_DONE.search(line)
+            with self._condition:
+                if done:
+                    self._last = (int(done.group(1)), self._diagnostics)
+                    self._diagnostics = []
+                    self._builds += 1
+                    self._condition.notify_all()
+                elif _TSC_DIAGNOSTIC.match(line) or (self._diagnostics and line.startswith(" ")):
+                    self._diagnostics.append(line)
+        with self._condition:
+            self._condition.notify_all()
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def _watcher(tsc, project_path):
+    with _watchers_lock:
+        watcher = _watchers.get(project_path)
+        if watcher is None or not watcher.alive:
+            watcher = TscWatcher(tsc, project_path)
+            _watchers[project_path] = watcher
+        return watcher
+
+
+@atexit.register
+def stop_watchers():
+    with _watchers_lock:
+        for watcher in _watchers.values():
+            watcher.stop()
+        _watchers.clear()
+
+
+def compile_project(project_path, update_sources, timeout=120, watch_timeout=15):
+    """
+    Compiles the project, reusing the warm watcher when WATCH_BUILDS is set.
+
+    :param project_path: Directory holding tsconfig.json
+    :param update_sources: Callable that writes the sources and returns whether any changed;
+        called after the watcher's build count is taken so no rebuild goes unnoticed
+    :param timeout: Seconds to wait for a one-shot compile
+    :param watch_timeout: Seconds to wait for the watcher before falling back to a one-shot compile
+    :return: Dictionary with status, mode, errors and seconds
+    """
+    tsc = find_tsc(project_path)
+    if tsc is None:
+        update_sources()
+        return {"status": "failed", "errors": ["TypeScript compiler not found; run npm install in node_runner"]}
+
+    start = time.perf_counter()
+    result = None
+    mode = "watch"
+    if WATCH_BUILDS:
+        watcher = _watcher(tsc, project_path)
+        if not watcher.builds:
+            # Let a new watcher finish its initial compile so it is not mistaken for ours
+            watcher.wait(0, timeout)
+        builds = watcher.builds
+        changed = update_sources()
+        if builds and not changed:
+            result = watcher.last()
+        elif builds:
+            result = watcher.wait(builds, watch_timeout)
+    else:
+        update_sources()
+
+    if result is None:
+        mode = "incremental"
+        completed = subprocess.run(
+            [tsc, "--incremental", "--pretty", "false", "-p", project_path],
+            capture_output=True, text=True, timeout=timeout,
+        )
+        diagnostics = [
+            line for line in completed.stdout.splitlines()
+            if _TSC_DIAGNOSTIC.match(line) or line.startswith(" ")
+        ]
+        result = (len([line for line in diagnostics if _TSC_DIAGNOSTIC.match(line)])
+                  or (1 if completed.returncode else 0), diagnostics)
+
+    error_count, diagnostics = result
+    return {
+        "status": "ok" if error_count == 0 else "failed",
+        "mode": mode,
+        "errors": diagnostics[:50],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_node(script, cwd, timeout, memory_mb):
+    """
+    Runs a compiled script with node, killing its process group on timeout.
+
+    :return: Dictionary with exit_status, timed_out, wall_seconds, peak_rss_mb, stdout and stderr
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        ["node", f"--max-old-space-size={memory_mb}", script],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    output = {}
+    readers = [
+        threading.Thread(target=lambda name=name, pipe=pipe: output.__setitem__(name, pipe.read()))
+        for name, pipe in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    peak_rss_mb = None
+    try:
+        if hasattr(os, "wait4"):
+            # wait4 reports the child's own peak RSS, in KiB on Linux
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            peak_rss_mb = round(usage.ru_maxrss / 1024, 1)
+        else:
+            process.wait()
+    finally:
+        timer.cancel()
+    for reader in readers:
+        reader.join()
+
+    return {
+        "exit_status": process.returncode,
+        "timed_out": timed_out.is_set(),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": peak_rss_mb,
+        "stdout": _clip(output.get("stdout", b"").decode("utf-8", errors="replace")),
+        "stderr": _clip(output.get("stderr", b"").decode("utf-8", errors="replace")),
+    }
+
+
+def _clip(text):
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    half = MAX_OUTPUT_CHARS // 2
+    return f"{text[:half]}\n... {len(text) - MAX_OUTPUT_CHARS} characters omitted ...\n{text[-half:]}"
+
+
+async def build_and_run(input_data):
+    """
+    Copies a solution into node_runner, compiles it and runs it.
+
+    :param input_data: Dictionary containing solution_path and optional input_file,
+        timeout_seconds and memory_mb
+    :return: Dictionary containing build_results and, if the build succeeded, run_results
+    """
+    return await _offload(_build_and_run, input_data)
+
+
+def _build_and_run(input_data, project_path=NODE_RUNNER_PATH):
+    try:
+        solution_path = input_data.get("solution_path")
+        input_file = input_data.get("input_file")
+        timeout = input_data.get("timeout_seconds") or 60
+        memory_mb = input_data.get("memory_mb") or 4096
+
+        if not solution_path:
+            return {"error": "solution_path not provided"}
+
+        source = os.path.join(solution_path, "index.ts")
+        if not os.path.isfile(source):
+            return {"error": "index.ts not found in solution_path"}
+
+        if not input_file and os.path.isfile(os.path.join(solution_path, "input.txt")):
+            input_file = os.path.join(solution_path, "input.txt")
+        if input_file and not os.path.isfile(input_file):
+            return {"error": "input_file does not exist"}
+
+        # One build/run per project at a time; the copies below replace its sources
+        def update_sources():
+            changed = False
+            for file_source, file_dest in ((source, "index.ts"), (input_file, "input.txt")):
+                if not file_source:
+                    continue
+                file_dest = os.path.join(project_path, "src", file_dest)
+                if not _same_content(file_source, file_dest):
+                    fast_copy(file_source, file_dest)
+                    file_cache.invalidate(file_dest)
+                    changed = changed or file_dest.endswith(".ts")
+            return changed
+
+        with _path_locks[project_path]:
+            build = compile_project(project_path, update_sources)
+            result = {"build_results": json.dumps(build)}
+            if build["status"] == "ok":
+                # Solutions read src/input.txt relative to the project root
+                run = run_node(os.path.join("build", "index.js"), project_path, timeout, memory_mb)
+                result["run_results"] = json.dumps(run)
+            return result
+
+    except Exception as e:
+        return {"error": type(e).__name__, "message": str(e)}
+
+
+node_runner_tool_functions = {
+    "Build_And_Run_Tool": build_and_run,
+}
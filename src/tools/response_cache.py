@@ -0,0 +1,228 @@
+'''
+Disk-backed cache of model responses for replaying deterministic (temperature 0) sessions
+
+Modes:
+- record: always call the model and store the response, replacing any cached copy
+- replay: only serve cached responses; a miss raises CacheMissError
+- auto: serve cached responses and record misses
+- bypass: no caching
+
+Configure with PUZZLER_CACHE_MODE and PUZZLER_CACHE_DIR, or pass a ResponseCache to UIClient.
+'''
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+CACHE_MODES = ("record", "replay", "auto", "bypass")
+
+# Tool result fields that change between otherwise identical runs: file mtimes and the
+# timings and memory use reported by the node runner
+VOLATILE_FIELDS = ("modified", "seconds", "wall_seconds", "peak_rss_mb")
+_MODIFIED_TEXT = re.compile(r"(, modified )\S+")
+
+
+class CacheMissError(RuntimeError):
+    '''
+    Raised in replay mode when a request has no recorded response
+    '''
+
+
+class ResponseCache:
+    '''
+    Stores one JSON file per request hash, evicting least recently used entries once the
+    directory grows beyond max_bytes
+    '''
+
+    def __init__(self, cache_dir=".response_cache", mode="auto", max_bytes=256 * 1024 * 1024):
+        """
+        :param cache_dir: Directory holding the cached responses
+        :param mode: One of CACHE_MODES
+        :param max_bytes: Total size of cached responses to keep
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}; expected one of {CACHE_MODES}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a cache from PUZZLER_CACHE_MODE / PUZZLER_CACHE_DIR, or None when bypassed.
+        """
+        mode = os.environ.get("PUZZLER_CACHE_MODE", "bypass")
+        if mode == "bypass":
+            return None
+        return cls(os.environ.get("PUZZLER_CACHE_DIR", ".response_cache"), mode)
+
+    @staticmethod
+    def request_key(request):
+        """
+        Hashes everything that determines a response: model id, inference config, system
+        prompt, conversation (including tool results) and tool configuration.
+
+        Tool results carry mtimes and timings that differ on every run; they are left out
+        (see _normalize) so a replayed session that writes files still finds its responses.
+        """
+        relevant = {
+            field: request.get(field)
+            for field in ("modelId", "inferenceConfig", "system", "messages", "toolConfig")
+        }
+        relevant["messages"] = _normalize(relevant["messages"])
+        encoded = json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            with self._lock:
+                self._discard(key)
+            return None
+
+    def put(self, key, value):
+        data = json.dumps(value, default=str)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp_path, self._path(key))
+
+        with self._lock:
+            self._discard(key, remove_file=False)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _discard(self, key, remove_file=True):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+            if remove_file:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+
+
+def _normalize(value):
+    """
+    Drops VOLATILE_FIELDS from messages, including inside tool results that hold JSON
+    strings (write_results, file_data, ...) and compact read_files listings.
+    """
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        if value.startswith("{"):
+            try:
+                return _normalize(json.loads(value))
+            except ValueError:
+                pass
+        return _MODIFIED_TEXT.sub(r"\1", value)
+    return value
+
+
+class CachingClient:
+    '''
+    Wraps a bedrock-runtime client so converse/converse_stream go through a ResponseCache
+    '''
+
+    def __init__(self, client, cache):
+        """
+        :param client: bedrock-runtime compatible client
+        :param cache: ResponseCache to read from and record into
+        """
+        self._client = client
+        self._cache = cache
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def converse(self, **kwargs):
+        if self._cache.mode == "bypass":
+            return self._client.converse(**kwargs)
+
+        key = "converse-" + self._cache.request_key(kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        response = self._client.converse(**kwargs)
+        # Drop the boto3 transport details; they are neither stable nor serializable
+        response = {k: v for k, v in response.items() if k != "ResponseMetadata"}
+        self._cache.put(key, response)
+        return response
+
+    def converse_stream(self, **kwargs):
+        if self._cache.mode == "bypass":
+            return self._client.converse_stream(**kwargs)
+
+        key = "stream-" + self._cache.request_key(kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return {"stream": iter(cached)}
+
+        response = self._client.converse_stream(**kwargs)
+        return {**response, "stream": self._recorded_stream(key, response["stream"])}
+
+    def _lookup(self, key):
+        if self._cache.mode in ("replay", "auto"):
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            if self._cache.mode == "replay":
+                raise CacheMissError(f"No recorded response for request {key}")
+        return None
+
+    def _recorded_stream(self, key, stream):
+        events = []
+        for event in stream:
+            events.append(event)
+            yield event
+        self._cache.put(key, events)
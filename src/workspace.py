@@ -0,0 +1,39 @@
+'''
+Prepares the work folder for a new puzzle without re-copying unchanged files
+
+Example:
+    python src/workspace.py --input node_runner/input.day20.txt
+'''
+import argparse
+import os
+
+from tools import filesystem_tool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage a fresh work folder from a template")
+    parser.add_argument("--base", default="solved_work_base", help="Template folder to copy from")
+    parser.add_argument("--work", default="work", help="Work folder to populate")
+    parser.add_argument("--input", help="Puzzle input to place in 01_PUZZLE/input.txt")
+    parser.add_argument("--puzzle", help="Puzzle narrative to place in 01_PUZZLE/puzzle.txt")
+    parser.add_argument("--link", action="store_true",
+                        help="Hard link files instead of copying them (do not edit them in place)")
+    parser.add_argument("--clean", action="store_true",
+                        help="Remove files in the work folder that are not in the template")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.input:
+        overrides[os.path.join("01_PUZZLE", "input.txt")] = args.input
+    if args.puzzle:
+        overrides[os.path.join("01_PUZZLE", "puzzle.txt")] = args.puzzle
+
+    results = filesystem_tool.stage_workspace(
+        args.base, args.work, overrides=overrides, link=args.link, clean=args.clean
+    )
+    for path, status in sorted(results.items()):
+        print(f"{status:>9}  {path}")
+
+
+if __name__ == "__main__":
+    main()